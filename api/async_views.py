@@ -0,0 +1,150 @@
+"""
+Async read-only endpoints for the hottest GET paths.
+
+DRF views are synchronous, so these are plain Django async views that use
+the async ORM and reuse the DRF serializers (which do no I/O once the
+querysets carry their joined rows). Under an ASGI server such as uvicorn
+a request waiting on the database does not hold a worker.
+"""
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+
+from .authentication import StatelessJWTAuthentication
+from .models import Patient, Doctor, PatientDoctorMapping
+from .pagination import KeysetCursorPagination
+from .renderers import FastJSONRenderer
+from .serializers import (
+    PatientSerializer,
+    PatientListSerializer,
+    DoctorSerializer,
+    DoctorListSerializer,
+    PatientDoctorMappingSerializer,
+    values_representation
+)
+from .throttling import UserThrottle
+
+renderer = FastJSONRenderer()
+
+
+def json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    return HttpResponse(renderer.render(data), status=status_code, content_type='application/json', headers=headers)
+
+
+def check_request(request):
+    """
+    Authenticate the request from its JWT claims and apply the per-user
+    rate limit. Returns a 401 or 429 response in the same shape as DRF,
+    or None to let the request through.
+    """
+    try:
+        result = StatelessJWTAuthentication().authenticate(request)
+    except exceptions.AuthenticationFailed as e:
+        return json_response({'detail': e.detail}, e.status_code)
+    if result is None:
+        return json_response(
+            {'detail': 'Authentication credentials were not provided.'},
+            status.HTTP_401_UNAUTHORIZED,
+        )
+    request.user, request.auth = result
+    throttle = UserThrottle()
+    if not throttle.allow_request(request, None):
+        wait = math.ceil(throttle.wait())
+        return json_response(
+            {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            headers={'Retry-After': str(wait)},
+        )
+    return None
+
+
+def authenticated(view):
+    async def wrapper(request, *args, **kwargs):
+        # The deny-list and a THROTTLE_STORE=cache bucket may block on the
+        # cache, so the checks run in a thread rather than on the event loop
+        response = await sync_to_async(check_request)(request)
+        if response is not None:
+            return response
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def only_get(view):
+    async def wrapper(request, *args, **kwargs):
+        if request.method != 'GET':
+            return json_response(
+                {'detail': f'Method "{request.method}" not allowed.'},
+                status.HTTP_405_METHOD_NOT_ALLOWED,
+            )
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def not_found():
+    return json_response({'detail': 'Not found.'}, status.HTTP_404_NOT_FOUND)
+
+
+async def paginated_response(queryset, request, serializer_class):
+    paginator = KeysetCursorPagination()
+    if not settings.API_FAST_LIST_SERIALIZERS:
+        page = await paginator.apaginate_queryset(queryset, request)
+        serializer = serializer_class(page, many=True)
+        return json_response(paginator.get_paginated_data(serializer.data))
+    representation = values_representation(serializer_class)
+    page = await paginator.apaginate_queryset(representation.values(queryset), request)
+    return json_response(paginator.get_paginated_data(representation.to_representation(page)))
+
+
+@only_get
+@authenticated
+async def patient_list(request):
+    queryset = Patient.objects.filter(user_id=request.user.id)
+    return await paginated_response(queryset, request, PatientListSerializer)
+
+
+@only_get
+@authenticated
+async def patient_detail(request, pk):
+    try:
+        patient = await Patient.objects.select_related('user').aget(pk=pk, user_id=request.user.id)
+    except Patient.DoesNotExist:
+        return not_found()
+    return json_response(PatientSerializer(patient).data)
+
+
+@only_get
+@authenticated
+async def patient_doctors(request, pk):
+    if not await Patient.objects.filter(pk=pk, user_id=request.user.id).aexists():
+        return not_found()
+    queryset = PatientDoctorMapping.objects.with_related().filter(patient_id=pk)
+    return await paginated_response(queryset, request, PatientDoctorMappingSerializer)
+
+
+@only_get
+@authenticated
+async def doctor_list(request):
+    queryset = Doctor.objects.all()
+    return await paginated_response(queryset, request, DoctorListSerializer)
+
+
+@only_get
+@authenticated
+async def doctor_detail(request, pk):
+    try:
+        doctor = await Doctor.objects.aget(pk=pk)
+    except Doctor.DoesNotExist:
+        return not_found()
+    return json_response(DoctorSerializer(doctor).data)
+
+
+@only_get
+@authenticated
+async def doctor_patients(request, pk):
+    if not await Doctor.objects.filter(pk=pk).aexists():
+        return not_found()
+    queryset = PatientDoctorMapping.objects.with_related().filter(doctor_id=pk)
+    return await paginated_response(queryset, request, PatientDoctorMappingSerializer)
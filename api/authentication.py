@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+DENYLIST_PREFIX = 'jwt:revoked:'
+# Tokens whose deny-list lookup is remembered per process
+DENYLIST_MEMO_SIZE = 10000
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after ttl seconds.
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+user_cache = TTLCache(settings.JWT_USER_CACHE_SIZE, settings.JWT_USER_CACHE_TTL)
+
+
+def get_cached_user(user_id):
+    user = user_cache.get(user_id)
+    if user is None:
+        user = User.objects.filter(pk=user_id).first()
+        if user is not None:
+            user_cache.set(user_id, user)
+    return user
+
+
+class DenyList:
+    """
+    Revoked tokens and users, one key each in the shared cache so that
+    concurrent revocations never overwrite each other. Every key expires
+    with the last token it can reject:
+
+    'jwt:revoked:jti:<id>' rejects a single token until its exp;
+    'jwt:revoked:user:<id>' holds the time of revocation and rejects every
+    token of that user issued up to then.
+
+    The keys found for a token are remembered in process memory for
+    JWT_DENYLIST_REFRESH seconds, so checking the same token again costs
+    no I/O. With the default per-process memory cache (no REDIS_URL) a
+    revocation only applies in the process that made it.
+    """
+    def __init__(self):
+        self._checked = TTLCache(DENYLIST_MEMO_SIZE, settings.JWT_DENYLIST_REFRESH)
+
+    def keys(self, token):
+        keys = [f'{DENYLIST_PREFIX}user:{token.get(jwt_settings.USER_ID_CLAIM)}']
+        jti = token.get(jwt_settings.JTI_CLAIM)
+        if jti is not None:
+            keys.append(f'{DENYLIST_PREFIX}jti:{jti}')
+        return keys
+
+    def add_token(self, jti, expires):
+        timeout = expires - time.time()
+        if timeout > 0:
+            cache.set(f'{DENYLIST_PREFIX}jti:{jti}', True, timeout=timeout)
+        self._checked.clear()
+
+    def add_user(self, user_id):
+        lifetime = max(jwt_settings.ACCESS_TOKEN_LIFETIME, jwt_settings.REFRESH_TOKEN_LIFETIME)
+        cache.set(f'{DENYLIST_PREFIX}user:{user_id}', time.time(), timeout=lifetime.total_seconds())
+        self._checked.clear()
+
+    def is_revoked(self, token):
+        keys = self.keys(token)
+        found = self._checked.get(tuple(keys))
+        if found is None:
+            found = cache.get_many(keys)
+            self._checked.set(tuple(keys), found)
+        if not found:
+            return False
+        if len(keys) > 1 and found.get(keys[1]):
+            return True
+        # Tokens issued after the revocation are valid again
+        revoked_at = found.get(keys[0])
+        return revoked_at is not None and token.get('iat', 0) <= revoked_at
+
+
+deny_list = DenyList()
+
+
+def revoke_token(token):
+    """
+    Reject this access or refresh token until it expires.
+    """
+    deny_list.add_token(token[jwt_settings.JTI_CLAIM], token['exp'])
+
+
+def revoke_user(user_id):
+    """
+    Reject every access and refresh token issued to the user so far.
+    """
+    user_cache.pop(user_id)
+    deny_list.add_user(user_id)
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Token refresh that refuses revoked refresh tokens, and revokes a
+    refresh token once it has been rotated for a new one.
+    """
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if deny_list.is_revoked(refresh):
+            raise InvalidToken('Token has been revoked')
+        data = super().validate(attrs)
+        if jwt_settings.ROTATE_REFRESH_TOKENS and jwt_settings.BLACKLIST_AFTER_ROTATION:
+            revoke_token(self.token_class(attrs['refresh']))
+        return data
+
+
+class StatelessUser(TokenUser):
+    """
+    Token user built from the JWT claims. The database row is only loaded,
+    through the in-process user cache, for attributes the token lacks.
+    """
+    @cached_property
+    def user(self):
+        return get_cached_user(self.id)
+
+    @cached_property
+    def is_staff(self):
+        if 'is_staff' in self.token:
+            return self.token['is_staff']
+        return self.user is not None and self.user.is_staff
+
+    @cached_property
+    def is_superuser(self):
+        if 'is_superuser' in self.token:
+            return self.token['is_superuser']
+        return self.user is not None and self.user.is_superuser
+
+    @cached_property
+    def username(self):
+        if 'username' in self.token:
+            return self.token['username']
+        return self.user.username if self.user is not None else ''
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    JWT authentication that trusts the signed claims instead of loading the
+    User row on every request, after checking the revocation deny-list.
+    """
+    def get_user(self, validated_token):
+        if jwt_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken('Token contained no recognizable user identification')
+        if deny_list.is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked')
+        return StatelessUser(validated_token)
+
+
+class RevocableJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads the User row as usual, used when
+    JWT_STATELESS_AUTH is off, after checking the same deny-list so that
+    logout and revocation work either way.
+    """
+    def get_user(self, validated_token):
+        if deny_list.is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked')
+        return super().get_user(validated_token)
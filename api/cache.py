@@ -0,0 +1,131 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Patient
+
+DOCTOR_VERSION_KEY = 'doctors:version'
+DOCTOR_HITS_KEY = 'doctors:hits'
+DOCTOR_MISSES_KEY = 'doctors:misses'
+OWNED_PATIENTS_KEY = 'patients:owned:{}'
+# Cached instead of the ids for users owning more than OWNERSHIP_INDEX_MAX_SIZE patients
+TOO_MANY_PATIENTS = 'too-many'
+
+
+def get_doctor_version():
+    version = cache.get(DOCTOR_VERSION_KEY)
+    if version is None:
+        cache.add(DOCTOR_VERSION_KEY, 1, timeout=None)
+        version = cache.get(DOCTOR_VERSION_KEY, 1)
+    return version
+
+
+def bump_doctor_version():
+    """
+    Invalidate every cached doctor response once the current transaction
+    commits, so no reader can cache pre-commit data under the new version.
+    """
+    transaction.on_commit(_increment_doctor_version)
+
+
+def _increment_doctor_version():
+    try:
+        cache.incr(DOCTOR_VERSION_KEY)
+    except ValueError:
+        cache.set(DOCTOR_VERSION_KEY, 2, timeout=None)
+
+
+def doctor_cache_key(request, action):
+    """
+    Key a doctor response on the action, the full URL (path, query params
+    and host, which appears in pagination links) and the table version.
+    """
+    url = hashlib.md5(request.build_absolute_uri().encode('utf-8')).hexdigest()
+    return f'doctors:v{get_doctor_version()}:{action}:{url}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+def get_cached_doctor_response(key):
+    data = cache.get(key)
+    _count(DOCTOR_MISSES_KEY if data is None else DOCTOR_HITS_KEY)
+    return data
+
+
+def set_cached_doctor_response(key, data):
+    cache.set(key, data, timeout=settings.DOCTOR_CACHE_TIMEOUT)
+
+
+def doctor_cache_stats():
+    hits = cache.get(DOCTOR_HITS_KEY, 0)
+    misses = cache.get(DOCTOR_MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_doctor_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def owned_patient_ids(user_id):
+    """
+    Frozen set of the ids of the user's patients, cached until one of them
+    is created, deleted or moved to another user. None when the user owns
+    too many patients for the set to be worth caching. Invalidation only
+    reaches other processes through a shared cache, so queries keep their
+    own owner filter and use the set to turn requests away early.
+    """
+    key = OWNED_PATIENTS_KEY.format(user_id)
+    ids = cache.get(key)
+    if ids is None:
+        # Authorization data: read the primary, never a lagging replica
+        ids = list(
+            Patient.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id)
+            .values_list('id', flat=True)[:settings.OWNERSHIP_INDEX_MAX_SIZE + 1]
+        )
+        ids = frozenset(ids) if len(ids) <= settings.OWNERSHIP_INDEX_MAX_SIZE else TOO_MANY_PATIENTS
+        cache.set(key, ids, timeout=settings.OWNERSHIP_INDEX_TIMEOUT)
+    return None if ids == TOO_MANY_PATIENTS else ids
+
+
+def filter_owned_patients(user_id, patient_ids):
+    """
+    The subset of patient_ids owned by the user: one cache lookup, or one
+    query for users too large for the index.
+    """
+    ids = set()
+    for patient_id in patient_ids:
+        try:
+            ids.add(int(patient_id))
+        except (TypeError, ValueError):
+            continue
+    owned = owned_patient_ids(user_id)
+    if owned is None:
+        # Read the primary like the index itself
+        return set(
+            Patient.objects.using(DEFAULT_DB_ALIAS).filter(user_id=user_id, id__in=ids)
+            .values_list('id', flat=True)
+        )
+    return ids & owned
+
+
+def owns_patient(user_id, patient_id):
+    return bool(filter_owned_patients(user_id, [patient_id]))
+
+
+def invalidate_owned_patients(*user_ids):
+    """
+    Drop the users' ownership index now and again once the current
+    transaction commits, so it cannot be rebuilt from pre-commit data.
+    """
+    keys = [OWNED_PATIENTS_KEY.format(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
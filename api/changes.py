@@ -0,0 +1,152 @@
+"""
+Incremental change feed for clients that keep a local copy of their
+patients and assignments.
+
+A feed page lists the rows changed (by updated_at) and the rows removed
+(by Tombstone.deleted_at) since an opaque cursor, merged in time order.
+Rows are only served once they are CHANGE_FEED_SETTLE_SECONDS old, so a
+transaction that stamped a row before committing cannot slip in behind a
+cursor that has already moved past its timestamp.
+"""
+import base64
+import heapq
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import Tombstone
+from .routers import use_primary
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def record_tombstones(kind, user_id, object_ids, using=None):
+    """
+    Tell user_id's feed that the given rows are gone.
+    """
+    Tombstone.objects.using(using).bulk_create([
+        Tombstone(kind=kind, object_id=object_id, user_id=user_id)
+        for object_id in object_ids
+    ])
+
+
+def encode_cursor(rows, deleted):
+    data = json.dumps({'r': rows, 'd': deleted}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(encoded):
+    """
+    Return the (timestamp, id) positions of the last change and last
+    deletion served, the former None until a row has been served.
+    """
+    try:
+        padded = encoded + '=' * (-len(encoded) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        rows, deleted = data['r'], data['d']
+        positions = [
+            None if position is None else (datetime.fromisoformat(position[0]), int(position[1]))
+            for position in (rows, deleted)
+        ]
+    except (TypeError, ValueError, KeyError, IndexError, UnicodeError, AttributeError):
+        raise InvalidCursor(encoded)
+    if positions[1] is None or any(p is not None and timezone.is_naive(p[0]) for p in positions):
+        raise InvalidCursor(encoded)
+    return positions
+
+
+def after(field, position):
+    timestamp, pk = position
+    return Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'id__gt': pk})
+
+
+def dump_position(timestamp, pk):
+    return [timestamp.isoformat(), pk]
+
+
+def change_feed_response(request, queryset, kind, serializer_class, page_size):
+    """
+    One page of the feed over queryset (already limited to the user's
+    rows) and the user's tombstones of the given kind:
+
+        {"results": [...], "deleted": [ids], "since": cursor, "has_more": bool}
+
+    Without ?since= the feed starts from the first row, which is a full
+    sync; deletions are then only reported from that moment on.
+    """
+    now = timezone.now()
+    horizon = now - timedelta(seconds=settings.CHANGE_FEED_SETTLE_SECONDS)
+    since = request.query_params.get('since')
+    if since:
+        try:
+            rows_position, deleted_position = decode_cursor(since)
+        except InvalidCursor:
+            return Response({
+                'error': 'Invalid since cursor'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if deleted_position[0] < now - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS):
+            # Tombstones this old may have been pruned
+            return Response({
+                'error': 'since cursor has expired, sync again without it'
+            }, status=status.HTTP_410_GONE)
+    else:
+        rows_position, deleted_position = None, (horizon, 0)
+
+    rows = queryset.filter(updated_at__lt=horizon)
+    if rows_position is not None:
+        rows = rows.filter(after('updated_at', rows_position))
+    tombstones = Tombstone.objects.filter(
+        after('deleted_at', deleted_position),
+        user_id=request.user.id, kind=kind, deleted_at__lt=horizon,
+    ).values_list('deleted_at', 'id', 'object_id')
+
+    # The feed's cursor must never run ahead of what has committed, which
+    # a lagging replica cannot promise
+    with use_primary():
+        rows = list(rows.order_by('updated_at', 'id')[:page_size + 1])
+        tombstones = list(tombstones.order_by('deleted_at', 'id')[:page_size + 1])
+
+    events = heapq.merge(
+        ((row.updated_at, 0, row.id, row) for row in rows),
+        ((deleted_at, 1, pk, object_id) for deleted_at, pk, object_id in tombstones),
+        key=lambda event: event[:3],
+    )
+    # A row can leave the feed and come back (a patient moved away and
+    # back), so only its latest event in the page counts
+    latest = {}
+    served_deleted = 0
+    for served, (timestamp, deleted, pk, item) in enumerate(events):
+        if served == page_size:
+            has_more = True
+            break
+        if deleted:
+            deleted_position = (timestamp, pk)
+            served_deleted += 1
+            latest[item] = None
+        else:
+            rows_position = (timestamp, pk)
+            latest[item.id] = item
+    else:
+        has_more = False
+    if served_deleted == len(tombstones) <= page_size:
+        # No deletion is left before the horizon; moving past it keeps the
+        # cursor of a client that never sees one inside the retention window
+        deleted_position = (horizon, 0)
+
+    changed = [item for item in latest.values() if item is not None]
+    return Response({
+        'results': serializer_class(changed, many=True, context={'request': request}).data,
+        'deleted': [object_id for object_id, item in latest.items() if item is None],
+        'since': encode_cursor(
+            rows_position and dump_position(*rows_position),
+            dump_position(*deleted_position),
+        ),
+        'has_more': has_more,
+    })
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Token revocation, replica pins and the ownership index only reach every
+    worker process through a shared cache.
+    """
+    if settings.REDIS_URL:
+        return []
+    return [Warning(
+        'REDIS_URL is not set, so the cache is per process.',
+        hint='Logout and token revocation then only apply in the worker process that handled them. '
+             'Set REDIS_URL when running more than one process.',
+        id='api.W001',
+    )]
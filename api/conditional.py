@@ -0,0 +1,33 @@
+import hashlib
+from calendar import timegm
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    """
+    Build a weak ETag from the values that determine a response body.
+    """
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"'
+
+
+def conditional_headers(etag, last_modified=None):
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return headers
+
+
+def not_modified_response(request, etag, last_modified=None):
+    """
+    Return a bodiless 304 (or 412) response when the request's validators
+    match, otherwise None so the view renders the full response.
+    """
+    timestamp = timegm(last_modified.utctimetuple()) if last_modified is not None else None
+    result = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if result is None:
+        return None
+    return Response(status=result.status_code, headers=conditional_headers(etag, last_modified))
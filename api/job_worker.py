@@ -0,0 +1,13 @@
+"""
+Set-up of run_workers' pool processes. Spawned processes load this
+before Django is set up, so it must not import models.
+"""
+import signal
+
+import django
+
+
+def init_worker():
+    # Ctrl-C is left to run_workers, which lets running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    django.setup()
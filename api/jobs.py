@@ -0,0 +1,249 @@
+"""
+Background jobs for work too slow for a request: imports, exports and
+counter rebuilds.
+
+A job is a row in the Job table. The API queues it, and `manage.py
+run_workers` claims queued jobs and runs them in a pool of processes,
+so no broker is needed beyond the database. Handlers report progress on
+the row, and a heartbeat thread keeps it fresh so that jobs left behind
+by a dead worker can be told apart from slow ones and run again.
+"""
+import io
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import EXPORT_CHUNK_SIZE, iter_export, mapping_export, patient_export
+from .models import Job, SpecialtyStats, rebuild_specialty_stats
+from .serializers import ExportJobSerializer, ImportJobSerializer
+
+logger = logging.getLogger('api.jobs')
+
+# Seconds between progress writes to the job row
+PROGRESS_INTERVAL = 1.0
+
+# retry: whether a run cut short by a dead worker can simply start over
+JobKind = namedtuple('JobKind', 'handler params_serializer staff_only retry')
+
+
+def job_path(name):
+    return settings.JOB_FILES_DIR / name
+
+
+def save_upload(upload):
+    """
+    Store an uploaded file for a job and return the name it was saved under.
+    """
+    settings.JOB_FILES_DIR.mkdir(parents=True, exist_ok=True)
+    name = f'upload-{uuid.uuid4().hex}'
+    with open(job_path(name), 'wb') as f:
+        for chunk in upload.chunks():
+            f.write(chunk)
+    return name
+
+
+class Progress:
+    """
+    Callable handed to a handler: progress(done) or progress(done, total).
+    Writes to the job row at most every PROGRESS_INTERVAL seconds, and
+    never fails the job (SQLite, say, may be locked by another writer).
+    """
+    def __init__(self, job):
+        self.job = job
+        self.written = 0.0
+
+    def __call__(self, done, total=None):
+        now = time.monotonic()
+        if total is None and now - self.written < PROGRESS_INTERVAL:
+            return
+        self.written = now
+        fields = {'progress_done': done, 'heartbeat_at': timezone.now()}
+        if total is not None:
+            fields['progress_total'] = total
+        try:
+            Job.objects.filter(pk=self.job.pk, worker=self.job.worker).update(**fields)
+        except DatabaseError:
+            logger.warning('Could not record progress of job %s', self.job.pk, exc_info=True)
+
+
+def run_import(job, progress):
+    from .management.commands.import_healthcare import Command as ImportCommand
+
+    path = job_path(job.params['file'])
+    try:
+        with open(path, 'rb') as f:
+            lines = sum(1 for _ in f)
+        progress(0, lines - 1 if job.params['format'] == 'csv' else lines)
+        command = ImportCommand(stdout=io.StringIO(), stderr=io.StringIO())
+        call_command(
+            command, job.params['model'], str(path), file_format=job.params['format'],
+            user=job.user.username, verbosity=0, progress=progress,
+        )
+    finally:
+        path.unlink(missing_ok=True)
+    total = command.written + command.skipped + command.invalid
+    progress(total, total)
+    return {'written': command.written, 'skipped': command.skipped, 'invalid': command.invalid}
+
+
+def run_export(job, progress):
+    queryset, fields = {
+        'patients': patient_export,
+        'mappings': mapping_export,
+    }[job.params['model']](job.user_id)
+    output = job.params['format']
+    total = queryset.count()
+    progress(0, total)
+    settings.JOB_FILES_DIR.mkdir(parents=True, exist_ok=True)
+    name = f'export-{job.pk}.{output}'
+    rows = 0
+
+    def counted(rows_iter):
+        nonlocal rows
+        for row in rows_iter:
+            rows += 1
+            if rows % EXPORT_CHUNK_SIZE == 0:
+                progress(rows)
+            yield row
+
+    with open(job_path(name), 'w', newline='', encoding='utf-8') as f:
+        for chunk in iter_export(counted(queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)), fields, output):
+            f.write(chunk)
+    progress(rows, max(rows, total))
+    return {'file': name, 'rows': rows, 'bytes': job_path(name).stat().st_size}
+
+
+def run_recount(job, progress):
+    out = io.StringIO()
+    call_command('recount_assignments', stdout=out, no_color=True)
+    return {'output': out.getvalue().splitlines()}
+
+
+def run_rebuild_stats(job, progress):
+    rebuild_specialty_stats()
+    return {'specialties': SpecialtyStats.objects.count()}
+
+
+JOB_KINDS = {
+    # A half-done import would write its first rows twice
+    'import': JobKind(run_import, ImportJobSerializer, False, False),
+    'export': JobKind(run_export, ExportJobSerializer, False, True),
+    'recount_assignments': JobKind(run_recount, None, True, True),
+    'rebuild_doctor_stats': JobKind(run_rebuild_stats, None, True, True),
+}
+
+
+def worker_name():
+    # Unique per claim, so a worker can pick out the rows it just claimed
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def claim_jobs(limit):
+    """
+    Mark up to limit of the oldest queued jobs as running and return their ids.
+
+    Concurrent workers never claim the same job: on PostgreSQL (and other
+    backends with SKIP LOCKED) each takes row locks and skips rows another
+    worker has locked; SQLite has no row locks, but a single UPDATE runs
+    under its database write lock, so claims are serialized.
+    """
+    now = timezone.now()
+    worker = worker_name()
+    claim = {
+        'status': Job.RUNNING, 'worker': worker, 'started_at': now, 'heartbeat_at': now,
+        'attempts': F('attempts') + 1,
+    }
+    queued = Job.objects.filter(status=Job.QUEUED).order_by('created_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(queued.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claim)
+        return ids
+    Job.objects.filter(id__in=queued.values('id')[:limit]).update(**claim)
+    return list(Job.objects.filter(worker=worker).order_by('created_at', 'id').values_list('id', flat=True))
+
+
+def release_jobs(queryset, error):
+    """
+    Requeue the given running jobs, or fail those out of attempts or not
+    safe to run again.
+
+    Each job is decided once, under a lock: another worker may claim a
+    requeued job straight away, and must not see it failed under it.
+    """
+    with transaction.atomic():
+        jobs = list(
+            queryset.filter(status=Job.RUNNING).select_for_update().values_list('id', 'kind', 'attempts')
+        )
+        requeue, fail = [], []
+        for pk, kind, attempts in jobs:
+            retry = kind in JOB_KINDS and JOB_KINDS[kind].retry
+            (requeue if retry and attempts < settings.JOB_MAX_ATTEMPTS else fail).append(pk)
+        running = Job.objects.filter(status=Job.RUNNING)
+        requeued = running.filter(id__in=requeue).update(status=Job.QUEUED, worker='', heartbeat_at=None)
+        failed = running.filter(id__in=fail).update(status=Job.FAILED, error=error, finished_at=timezone.now())
+    return requeued, failed
+
+
+def requeue_stale_jobs():
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return release_jobs(Job.objects.filter(heartbeat_at__lt=cutoff), 'Worker stopped responding')
+
+
+class Heartbeat(threading.Thread):
+    """
+    Refreshes a running job's heartbeat_at until stopped, so long steps
+    that report no progress are not mistaken for a dead worker.
+    """
+    def __init__(self, job):
+        super().__init__(daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT_SECONDS):
+                try:
+                    Job.objects.filter(pk=self.job.pk, worker=self.job.worker).update(heartbeat_at=timezone.now())
+                except DatabaseError:
+                    logger.warning('Heartbeat of job %s failed', self.job.pk, exc_info=True)
+        finally:
+            connection.close()
+
+
+def run_job(job_id):
+    """
+    Run a claimed job to completion and record the outcome. Called in a
+    worker process; returns the final status.
+    """
+    close_old_connections()
+    job = Job.objects.select_related('user').get(pk=job_id)
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        result = JOB_KINDS[job.kind].handler(job, Progress(job))
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.pk, job.kind)
+        outcome = {'status': Job.FAILED, 'error': f'{type(e).__name__}: {e}'}
+    else:
+        outcome = {'status': Job.SUCCEEDED, 'result': result}
+    finally:
+        heartbeat.stopped.set()
+        heartbeat.join()
+    # A job requeued while this worker looked dead belongs to its new worker
+    Job.objects.filter(pk=job.pk, worker=job.worker, status=Job.RUNNING).update(
+        finished_at=timezone.now(), heartbeat_at=None, **outcome,
+    )
+    close_old_connections()
+    return outcome['status']
@@ -0,0 +1,227 @@
+import csv
+import json
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from api.cache import bump_doctor_version, invalidate_owned_patients
+from api.models import (
+    Patient, Doctor, PatientDoctorMapping, adjust_specialty_stats, insert_assignments, recount_assignments
+)
+from api.serializers import (
+    PatientSerializer,
+    DoctorBulkSerializer,
+    PatientDoctorMappingBulkSerializer
+)
+
+MODELS = {
+    'patients': Patient,
+    'doctors': Doctor,
+    'mappings': PatientDoctorMapping,
+}
+
+
+def read_rows(path, file_format):
+    """
+    Yield (line_number, row) pairs from a CSV or NDJSON file without
+    loading it into memory.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    # Left to the serializer to report as invalid data
+                    row = line
+                yield line_number, row
+
+
+class Command(BaseCommand):
+    help = 'Stream patients, doctors or assignments from a CSV or NDJSON file into the database.'
+    # Called with the number of rows processed after each batch (set by import jobs)
+    stealth_options = ('progress',)
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=['patients', 'doctors', 'mappings'])
+        parser.add_argument('path', help='CSV or NDJSON file to import')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], dest='file_format',
+                            help='File format (default: guessed from the file extension)')
+        parser.add_argument('--user', help='Username that will own imported patients; '
+                                           'assignments are then only accepted for their patients')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows written per transaction (default: 5000)')
+        parser.add_argument('--copy', action='store_true',
+                            help='Write batches with COPY instead of INSERT (PostgreSQL only)')
+
+    def handle(self, *args, **options):
+        path = Path(options['path'])
+        if not path.exists():
+            raise CommandError(f'File not found: {path}')
+        file_format = options['file_format'] or ('csv' if path.suffix.lower() == '.csv' else 'ndjson')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy is only supported on PostgreSQL')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        self.kind = options['kind']
+        self.verbosity = options['verbosity']
+        self.use_copy = options['copy']
+        self.progress = options.get('progress')
+        self.owner = None
+        if self.kind == 'patients' and not options['user']:
+            raise CommandError('--user is required when importing patients')
+        if options['user']:
+            try:
+                self.owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User not found: {options["user"]}')
+        self.seen_licenses = set()
+
+        row_serializer = {
+            'patients': PatientSerializer,
+            'doctors': DoctorBulkSerializer,
+            'mappings': PatientDoctorMappingBulkSerializer,
+        }[self.kind]()
+
+        started = time.perf_counter()
+        self.written = self.skipped = self.invalid = 0
+        batch = []
+        for line_number, row in read_rows(path, file_format):
+            try:
+                batch.append((line_number, row_serializer.run_validation(row)))
+            except ValidationError as e:
+                self.report_invalid(line_number, e.detail)
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch)
+                batch = []
+                self.report_progress(started)
+        if batch:
+            self.write_batch(batch)
+
+        elapsed = time.perf_counter() - started
+        total = self.written + self.skipped + self.invalid
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {self.written} {self.kind} ({self.skipped} skipped, {self.invalid} invalid) '
+            f'from {total} rows in {elapsed:.1f}s, {total / elapsed if elapsed else 0:.0f} rows/s'
+        ))
+
+    def report_invalid(self, line_number, detail):
+        self.invalid += 1
+        if self.verbosity >= 2:
+            message = detail if isinstance(detail, str) else json.dumps(detail)
+            self.stderr.write(f'Line {line_number}: {message}')
+
+    def report_progress(self, started):
+        rows = self.written + self.skipped + self.invalid
+        if self.progress is not None:
+            self.progress(rows)
+        if self.verbosity >= 1:
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{rows} rows processed, {rows / elapsed if elapsed else 0:.0f} rows/s')
+
+    def write_batch(self, batch):
+        invalid = self.invalid
+        objs = getattr(self, f'build_{self.kind}')(batch)
+        self.skipped += len(batch) - len(objs) - (self.invalid - invalid)
+        model = MODELS[self.kind]
+        with transaction.atomic():
+            if model is not Patient:
+                bump_doctor_version()
+            if self.use_copy:
+                self.copy_objects(model, objs)
+            elif model is PatientDoctorMapping:
+                # Assignments inserted concurrently hit unique_together and are skipped
+                written = insert_assignments(objs)
+                self.skipped += len(objs) - len(written)
+                objs = written
+            else:
+                model.objects.bulk_create(objs)
+            if model is Patient:
+                # bulk_create and COPY send no post_save signals
+                invalidate_owned_patients(self.owner.id)
+            elif model is PatientDoctorMapping:
+                recount_assignments(objs)
+            elif model is Doctor:
+                specialties = Counter(doctor.specialty for doctor in objs)
+                adjust_specialty_stats([
+                    {'specialty': specialty, 'doctors': count} for specialty, count in specialties.items()
+                ])
+        self.written += len(objs)
+
+    def build_patients(self, batch):
+        return [Patient(user=self.owner, **data) for _, data in batch]
+
+    def build_doctors(self, batch):
+        licenses = {data['license_number'] for _, data in batch}
+        existing = set(
+            Doctor.objects.filter(license_number__in=licenses).values_list('license_number', flat=True)
+        )
+        objs = []
+        for line_number, data in batch:
+            license_number = data['license_number']
+            if license_number in existing or license_number in self.seen_licenses:
+                self.report_invalid(line_number, {
+                    'license_number': ['Doctor with this license number already exists']
+                })
+                continue
+            self.seen_licenses.add(license_number)
+            objs.append(Doctor(**data))
+        return objs
+
+    def build_mappings(self, batch):
+        patients = Patient.objects.filter(id__in={data['patient'] for _, data in batch})
+        if self.owner is not None:
+            patients = patients.filter(user=self.owner)
+        patient_ids = set(patients.values_list('id', flat=True))
+        doctor_ids = set(
+            Doctor.objects.filter(id__in={data['doctor'] for _, data in batch}).values_list('id', flat=True)
+        )
+        pairs = {(data['patient'], data['doctor']) for _, data in batch}
+        existing = set(
+            PatientDoctorMapping.objects.filter(patient_id__in=patient_ids, doctor_id__in=doctor_ids)
+            .values_list('patient_id', 'doctor_id')
+        ) & pairs
+        objs = []
+        for line_number, data in batch:
+            pair = (data['patient'], data['doctor'])
+            if data['patient'] not in patient_ids or data['doctor'] not in doctor_ids:
+                self.report_invalid(line_number, 'Patient or doctor not found')
+                continue
+            if pair in existing:
+                continue
+            existing.add(pair)
+            objs.append(PatientDoctorMapping(
+                patient_id=data['patient'],
+                doctor_id=data['doctor'],
+                is_primary=data['is_primary'],
+                notes=data['notes'],
+            ))
+        return objs
+
+    def copy_objects(self, model, objs):
+        """
+        Write a batch with PostgreSQL COPY, filling auto_now/auto_now_add
+        columns the same way save() would.
+        """
+        if not objs:
+            return
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            with cursor.copy(f'COPY {table} ({columns}) FROM STDIN') as copy:
+                for obj in objs:
+                    copy.write_row([f.pre_save(obj, add=True) for f in fields])
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.jobs import job_path
+from api.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Delete background jobs, and their export files, finished over JOB_RETENTION_DAYS ago.'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+        jobs = Job.objects.filter(status__in=[Job.SUCCEEDED, Job.FAILED], finished_at__lt=cutoff)
+        for result in jobs.exclude(result=None).values_list('result', flat=True).iterator():
+            if isinstance(result, dict) and 'file' in result:
+                job_path(result['file']).unlink(missing_ok=True)
+        deleted = jobs.delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} jobs'))
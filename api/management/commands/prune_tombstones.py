@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete change feed tombstones older than CHANGE_FEED_RETENTION_DAYS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Tombstones deleted per DELETE (default: 10000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        cutoff = timezone.now() - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS)
+        deleted = 0
+        while True:
+            batch = list(
+                Tombstone.objects.filter(deleted_at__lt=cutoff).order_by('deleted_at')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not batch:
+                break
+            deleted += Tombstone.objects.filter(id__in=batch).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstones'))
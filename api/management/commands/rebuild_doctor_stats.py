@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.models import SpecialtyStats, rebuild_specialty_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-specialty doctor statistics from the doctors and assignments.'
+
+    def handle(self, *args, **options):
+        rebuild_specialty_stats()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt statistics for {SpecialtyStats.objects.count()} specialties'
+        ))
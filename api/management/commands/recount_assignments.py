@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from api.cache import bump_doctor_version
+from api.models import Patient, Doctor
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Doctor.patient_count and Patient.doctor_count from the assignments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Primary key range recounted per UPDATE (default: 10000)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        for model, recount in ((Doctor, 'recount_patients'), (Patient, 'recount_doctors')):
+            last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            updated = 0
+            # Short transactions over primary key ranges keep row locks brief
+            for start in range(0, last_id + 1, batch_size):
+                with transaction.atomic():
+                    queryset = model.objects.filter(id__gte=start, id__lt=start + batch_size)
+                    updated += getattr(queryset, recount)()
+            self.stdout.write(f'Recounted {updated} {model._meta.verbose_name_plural.lower()}')
+        bump_doctor_version()
+        self.stdout.write(self.style.SUCCESS('Assignment counters rebuilt'))
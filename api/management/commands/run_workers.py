@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+
+from api.job_worker import init_worker
+from api.jobs import claim_jobs, release_jobs, requeue_stale_jobs, run_job
+from api.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs in a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1,
+                            help='Jobs run at once, one per process (default: CPU count)')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds between checks for new jobs when idle (default: 1)')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for more jobs')
+
+    def handle(self, *args, **options):
+        processes = options['processes']
+        if processes < 1:
+            raise CommandError('--processes must be positive')
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Spawned rather than forked processes, so none inherits this
+        # process's database connection
+        context = multiprocessing.get_context('spawn')
+        pool = ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker)
+        running = {}
+        self.stdout.write(f'Running jobs in {processes} processes')
+        try:
+            while True:
+                claimed = False
+                if not self.stopping:
+                    close_old_connections()
+                    try:
+                        requeued, failed = requeue_stale_jobs()
+                        if requeued or failed:
+                            self.stderr.write(f'Requeued {requeued} and failed {failed} stale jobs')
+                        if len(running) < processes:
+                            for job_id in claim_jobs(processes - len(running)):
+                                running[pool.submit(run_job, job_id)] = job_id
+                        claimed = True
+                    except DatabaseError as e:
+                        # Try again on the next round (SQLite gives up
+                        # waiting for a busy database, for one)
+                        self.stderr.write(f'Could not claim jobs: {e}')
+                if not running:
+                    if self.stopping or (options['burst'] and claimed):
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                lost = []
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        self.stdout.write(f'Job {job_id}: {future.result()}')
+                    except BrokenProcessPool:
+                        lost.append(job_id)
+                    except Exception as e:
+                        self.stderr.write(f'Job {job_id}: {type(e).__name__}: {e}')
+                        self.release(Job.objects.filter(pk=job_id), f'{type(e).__name__}: {e}')
+                if lost:
+                    # A process died, which takes down the whole pool and
+                    # every job running in it
+                    lost.extend(running.values())
+                    running.clear()
+                    self.stderr.write(f'Worker process died while running jobs {lost}')
+                    self.release(Job.objects.filter(pk__in=lost), 'Worker process died')
+                    pool.shutdown(wait=False)
+                    pool = ProcessPoolExecutor(processes, mp_context=context, initializer=init_worker)
+        finally:
+            pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS('Workers stopped'))
+
+    def release(self, jobs, error):
+        try:
+            requeued, failed = release_jobs(jobs, error)
+        except DatabaseError as e:
+            # Still running in the table, so requeued once they go stale
+            self.stderr.write(f'Could not release jobs: {e}')
+        else:
+            self.stderr.write(f'Requeued {requeued} and failed {failed} jobs')
+
+    def stop(self, signum, frame):
+        if not self.stopping:
+            self.stderr.write('Finishing running jobs before exiting')
+        self.stopping = True
@@ -0,0 +1,72 @@
+"""
+In-process Prometheus-style histograms fed by PerformanceMiddleware.
+
+Each worker process keeps its own series, so scrape every worker (or run
+a single one) when serving /metrics from a multi-process server.
+"""
+import threading
+
+from django.http import HttpResponse
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Cumulative histogram with one series per view label.
+    """
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, view, value):
+        with self._lock:
+            series = self._series.get(view)
+            if series is None:
+                # One counter per bucket, then +Inf, then the sum
+                series = self._series[view] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {view: list(values) for view, values in self._series.items()}
+        for view, values in sorted(series.items()):
+            label = view.replace('\\', '\\\\').replace('"', '\\"')
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{{view="{label}",le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{view="{label}",le="+Inf"}} {values[-2]}')
+            lines.append(f'{self.name}_sum{{view="{label}"}} {values[-1]}')
+            lines.append(f'{self.name}_count{{view="{label}"}} {values[-2]}')
+        return lines
+
+
+request_duration = Histogram(
+    'api_request_duration_seconds', 'Time spent handling the request.', DURATION_BUCKETS,
+)
+request_queries = Histogram(
+    'api_request_db_queries', 'SQL queries run by sampled requests.', QUERY_BUCKETS,
+)
+response_size = Histogram(
+    'api_response_size_bytes', 'Size of non-streaming response bodies.', SIZE_BUCKETS,
+)
+HISTOGRAMS = [request_duration, request_queries, response_size]
+
+
+def metrics_view(request):
+    """
+    Expose the histograms in the Prometheus text format.
+    """
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
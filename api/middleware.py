@@ -0,0 +1,243 @@
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+from . import metrics
+from .query_detector import QueryDetector, check
+
+logger = logging.getLogger('api.performance')
+
+
+class QueryTimer:
+    """
+    connection.execute_wrapper that counts queries and their total time.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def view_name(request):
+    """
+    Stable label for the view that handled the request, e.g.
+    'DoctorViewSet.list' or 'DoctorViewSet.search' for DRF viewsets and
+    the URL name for everything else.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    cls = getattr(match.func, 'cls', None)
+    if cls is not None:
+        actions = getattr(match.func, 'actions', None) or {}
+        return f'{cls.__name__}.{actions.get(request.method.lower(), request.method.lower())}'
+    return match.view_name or getattr(match.func, '__name__', 'unknown')
+
+
+def wrap_queries(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class HybridMiddleware:
+    """
+    Base for middleware that runs natively under both WSGI and ASGI, so
+    Django never has to adapt an async request to it. Database connections
+    belong to a thread, and under ASGI the ORM runs in a thread of its own:
+    query wrappers are installed there through sync_to_async, which also
+    keeps the timed queries off the event loop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self.handle(request)
+
+    def handle(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+    def get_response_with(self, request, wrapper):
+        with ExitStack() as stack:
+            wrap_queries(stack, wrapper)
+            return self.get_response(request)
+
+    async def aget_response_with(self, request, wrapper):
+        stack = ExitStack()
+        await sync_to_async(wrap_queries)(stack, wrapper)
+        try:
+            return await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """
+    Time every request and, for a PERF_SAMPLE_RATE fraction of them, count
+    the SQL queries and time the response rendering.
+
+    Sampled responses carry a Server-Timing header (db, render, app and
+    total) and are logged as one JSON line on the api.performance logger,
+    at WARNING when slower than PERF_SLOW_REQUEST_MS. Durations feed the
+    histograms served by /metrics when PERF_METRICS_ENABLED is set.
+
+    Queries run while a streaming response is consumed happen after this
+    middleware returns and are not counted.
+    """
+    def sampled(self):
+        return settings.PERF_SAMPLE_RATE >= 1 or random.random() < settings.PERF_SAMPLE_RATE
+
+    def handle(self, request):
+        started = time.perf_counter()
+        request.perf_render = None
+        timer = QueryTimer() if self.sampled() else None
+        if timer is None:
+            response = self.get_response(request)
+        else:
+            response = self.get_response_with(request, timer)
+        return self.finish(request, response, started, timer)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        request.perf_render = None
+        timer = QueryTimer() if self.sampled() else None
+        if timer is None:
+            response = await self.get_response(request)
+        else:
+            response = await self.aget_response_with(request, timer)
+        return self.finish(request, response, started, timer)
+
+    def finish(self, request, response, started, timer):
+        duration = time.perf_counter() - started
+        request.perf_view = view_name(request)
+        size = None if response.streaming else len(response.content)
+        if settings.PERF_METRICS_ENABLED:
+            metrics.request_duration.observe(request.perf_view, duration)
+            if size is not None:
+                metrics.response_size.observe(request.perf_view, size)
+            if timer is not None:
+                metrics.request_queries.observe(request.perf_view, timer.count)
+        if timer is not None:
+            self.report(request, response, duration, timer, size)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered (serialized to JSON) right after this
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.perf_render = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, duration, timer, size):
+        render = request.perf_render or 0.0
+        app = max(duration - timer.duration - render, 0.0)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.duration * 1000:.2f};desc="{timer.count} queries"',
+            f'render;dur={render * 1000:.2f}',
+            f'app;dur={app * 1000:.2f}',
+            f'total;dur={duration * 1000:.2f}',
+        ])
+        level = logging.WARNING if duration * 1000 >= settings.PERF_SLOW_REQUEST_MS else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps({
+                'view': request.perf_view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 2),
+                'db_queries': timer.count,
+                'db_ms': round(timer.duration * 1000, 2),
+                'render_ms': round(render * 1000, 2),
+                'bytes': size,
+            }))
+
+
+class QueryDetectorMiddleware(HybridMiddleware):
+    """
+    Report N+1 patterns and slow queries per request when QUERY_DETECTOR
+    is 'warn' or 'strict'; a no-op otherwise.
+    """
+    def handle(self, request):
+        mode = settings.QUERY_DETECTOR
+        if mode not in ('warn', 'strict'):
+            return self.get_response(request)
+        detector = QueryDetector()
+        response = self.get_response_with(request, detector)
+        check(f'{request.method} {request.path}', detector, mode)
+        return response
+
+    async def __acall__(self, request):
+        mode = settings.QUERY_DETECTOR
+        if mode not in ('warn', 'strict'):
+            return await self.get_response(request)
+        detector = QueryDetector()
+        response = await self.aget_response_with(request, detector)
+        check(f'{request.method} {request.path}', detector, mode)
+        return response
+
+
+class ConcurrencyLimitMiddleware(HybridMiddleware):
+    """
+    Answer 503 straight away once MAX_IN_FLIGHT_REQUESTS requests are being
+    handled by this process, instead of queueing more work behind slow
+    requests; a no-op when the setting is 0. A streamed response gives up
+    its slot when the view returns, before the body is sent.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        limit = settings.MAX_IN_FLIGHT_REQUESTS
+        self.slots = threading.BoundedSemaphore(limit) if limit else None
+
+    def busy(self):
+        return JsonResponse({
+            'error': 'Server is busy, please retry shortly'
+        }, status=503, headers={'Retry-After': str(settings.MAX_IN_FLIGHT_RETRY_AFTER)})
+
+    def handle(self, request):
+        if self.slots is None:
+            return self.get_response(request)
+        if not self.slots.acquire(blocking=False):
+            return self.busy()
+        try:
+            return self.get_response(request)
+        finally:
+            self.slots.release()
+
+    async def __acall__(self, request):
+        # Acquiring without blocking never stalls the event loop
+        if self.slots is None:
+            return await self.get_response(request)
+        if not self.slots.acquire(blocking=False):
+            return self.busy()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.slots.release()
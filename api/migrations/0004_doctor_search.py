@@ -0,0 +1,88 @@
+from django.db import migrations
+
+SQLITE_FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS api_doctor_fts USING fts5(
+        name, specialty, license_number,
+        content='api_doctor', content_rowid='id'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_insert AFTER INSERT ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_delete AFTER DELETE ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_update AFTER UPDATE ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+    """,
+    "INSERT INTO api_doctor_fts(api_doctor_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_DROP_SQL = [
+    'DROP TRIGGER IF EXISTS api_doctor_fts_insert',
+    'DROP TRIGGER IF EXISTS api_doctor_fts_delete',
+    'DROP TRIGGER IF EXISTS api_doctor_fts_update',
+    'DROP TABLE IF EXISTS api_doctor_fts',
+]
+
+
+def postgres_search_indexes():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return [
+        GinIndex(
+            SearchVector('name', 'specialty', 'license_number', config='simple'),
+            name='doctor_search_vector_idx',
+        ),
+        GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='doctor_name_trgm_idx'),
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    """
+    Full-text and trigram GIN indexes on PostgreSQL, an external-content
+    FTS5 table kept in sync by triggers on SQLite.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        Doctor = apps.get_model('api', 'Doctor')
+        for index in postgres_search_indexes():
+            schema_editor.add_index(Doctor, index)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_SQL:
+            schema_editor.execute(sql)
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        Doctor = apps.get_model('api', 'Doctor')
+        for index in postgres_search_indexes():
+            schema_editor.remove_index(Doctor, index)
+    elif vendor == 'sqlite':
+        for sql in SQLITE_FTS_DROP_SQL:
+            schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
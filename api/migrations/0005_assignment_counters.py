@@ -0,0 +1,43 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:24
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Patient = apps.get_model('api', 'Patient')
+    Doctor = apps.get_model('api', 'Doctor')
+    PatientDoctorMapping = apps.get_model('api', 'PatientDoctorMapping')
+
+    def assignment_count(field):
+        assignments = PatientDoctorMapping.objects.filter(**{field: OuterRef('pk')}).order_by()
+        return Coalesce(Subquery(assignments.values(field).annotate(count=Count('*')).values('count')), 0)
+
+    Patient.objects.update(doctor_count=assignment_count('patient'))
+    Doctor.objects.update(patient_count=assignment_count('doctor'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_doctor_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='patient_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of patients assigned, maintained from PatientDoctorMapping'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='doctor_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Number of doctors assigned, maintained from PatientDoctorMapping'),
+        ),
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['-patient_count', '-id'], name='doctor_load_idx'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
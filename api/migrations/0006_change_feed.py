@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 15:02
+
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copy_assigned_date(apps, schema_editor):
+    # Existing assignments were last changed, as far as anyone knows, when made
+    PatientDoctorMapping = apps.get_model('api', 'PatientDoctorMapping')
+    PatientDoctorMapping.objects.update(updated_at=F('assigned_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_assignment_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('patient', 'Patient'), ('mapping', 'Patient-Doctor Assignment')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField(help_text='The user whose feed the row left')),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['user_id', 'kind', 'deleted_at', 'id'], name='tombstone_feed_idx'),
+                    models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+                ],
+            },
+        ),
+        migrations.AddField(
+            model_name='patientdoctormapping',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_assigned_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['user', 'updated_at', 'id'], name='patient_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientdoctormapping',
+            index=models.Index(fields=['updated_at', 'id'], name='mapping_updated_idx'),
+        ),
+    ]
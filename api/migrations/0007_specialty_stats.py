@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:47
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def populate_stats(apps, schema_editor):
+    Doctor = apps.get_model('api', 'Doctor')
+    SpecialtyStats = apps.get_model('api', 'SpecialtyStats')
+    totals = Doctor.objects.order_by().values('specialty').annotate(
+        doctors=Count('id', distinct=True),
+        assignments=Count('patient_assignments'),
+        primary_assignments=Count('patient_assignments', filter=Q(patient_assignments__is_primary=True)),
+    )
+    SpecialtyStats.objects.bulk_create([SpecialtyStats(**row) for row in totals])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SpecialtyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('specialty', models.CharField(max_length=100, unique=True)),
+                ('doctors', models.PositiveIntegerField(default=0)),
+                ('assignments', models.PositiveIntegerField(default=0)),
+                ('primary_assignments', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Specialty Statistics',
+                'verbose_name_plural': 'Specialty Statistics',
+                'ordering': ['specialty'],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
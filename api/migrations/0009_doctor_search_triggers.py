@@ -0,0 +1,70 @@
+from django.db import migrations
+
+TRIGGER_NAMES = ['api_doctor_fts_insert', 'api_doctor_fts_delete', 'api_doctor_fts_update']
+
+INSERT_TRIGGER_SQL = """
+    CREATE TRIGGER api_doctor_fts_insert AFTER INSERT ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+"""
+
+DELETE_TRIGGER_SQL = """
+    CREATE TRIGGER api_doctor_fts_delete AFTER DELETE ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+    END
+"""
+
+# Only the indexed columns, so counter updates leave the FTS rows alone
+UPDATE_TRIGGER_SQL = """
+    CREATE TRIGGER api_doctor_fts_update
+    AFTER UPDATE OF name, specialty, license_number ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+"""
+
+# The 0004 trigger, fired by any update
+OLD_UPDATE_TRIGGER_SQL = """
+    CREATE TRIGGER api_doctor_fts_update AFTER UPDATE ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+"""
+
+
+def replace_triggers(schema_editor, update_trigger_sql):
+    """
+    Drop whatever FTS5 sync triggers exist (0004's, or none after a table
+    rebuild) and create them again.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in TRIGGER_NAMES:
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    for sql in [INSERT_TRIGGER_SQL, DELETE_TRIGGER_SQL, update_trigger_sql]:
+        schema_editor.execute(sql)
+
+
+def create_triggers(apps, schema_editor):
+    replace_triggers(schema_editor, UPDATE_TRIGGER_SQL)
+
+
+def restore_triggers(apps, schema_editor):
+    replace_triggers(schema_editor, OLD_UPDATE_TRIGGER_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_triggers, restore_triggers),
+    ]
@@ -1,8 +1,42 @@
-from django.db import models
+from collections import Counter
+
+from django.db import connection, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
+def assignment_count(field):
+    """
+    Correlated subquery counting the assignments that point at the outer
+    row through the given PatientDoctorMapping field.
+    """
+    assignments = PatientDoctorMapping.objects.filter(**{field: OuterRef('pk')}).order_by()
+    return Coalesce(
+        Subquery(assignments.values(field).annotate(count=Count('*')).values('count')),
+        0,
+    )
+
+
+class PatientQuerySet(models.QuerySet):
+    def recount_doctors(self, **fields):
+        """
+        Recompute doctor_count for every patient in the queryset in one UPDATE,
+        along with any other fields given.
+        """
+        return self.update(doctor_count=assignment_count('patient'), **fields)
+
+
+class DoctorQuerySet(models.QuerySet):
+    def recount_patients(self):
+        """
+        Recompute patient_count for every doctor in the queryset in one UPDATE.
+        """
+        return self.update(patient_count=assignment_count('doctor'))
+
+
 class Patient(models.Model):
     """
     Patient model linked to the user who created it.
@@ -34,17 +68,39 @@ class Patient(models.Model):
         blank=True,
         help_text="Patient's email address"
     )
+    doctor_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of doctors assigned, maintained from PatientDoctorMapping"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PatientQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Patients are always listed per owner, ordered by name
+            models.Index(fields=['user', 'name', 'id'], name='patient_user_name_idx'),
+            # Change feed: a user's patients in modification order
+            models.Index(fields=['user', 'updated_at', 'id'], name='patient_user_updated_idx'),
+        ]
         verbose_name = 'Patient'
         verbose_name_plural = 'Patients'
 
     def __str__(self):
         return f"{self.name} (Age: {self.age})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the ownership index notice a patient moving to another user,
+        # and the assignment feed a rename
+        instance._loaded_user_id = instance.__dict__.get('user_id')
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
 
 class Doctor(models.Model):
     """
@@ -74,17 +130,51 @@ class Doctor(models.Model):
         default=0,
         help_text="Years of medical experience"
     )
+    patient_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Number of patients assigned, maintained from PatientDoctorMapping"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = DoctorQuerySet.as_manager()
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id'], name='doctor_name_idx'),
+            models.Index(fields=['specialty', 'name'], name='doctor_specialty_name_idx'),
+            models.Index(fields=['-patient_count', '-id'], name='doctor_load_idx'),
+        ]
         verbose_name = 'Doctor'
         verbose_name_plural = 'Doctors'
 
     def __str__(self):
         return f"Dr. {self.name} ({self.specialty})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the specialty statistics notice a doctor changing specialty,
+        # and the assignment feed a rename
+        instance._loaded_specialty = instance.__dict__.get('specialty')
+        instance._loaded_name = instance.__dict__.get('name')
+        return instance
+
+
+class PatientDoctorMappingQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Join the patient and doctor columns the mapping serializer reads,
+        leaving wide columns such as the patient's address unloaded.
+        """
+        return self.select_related('patient', 'doctor').only(
+            'id', 'assigned_date', 'updated_at', 'is_primary', 'notes',
+            'patient__id', 'patient__name', 'patient__user_id',
+            'doctor__id', 'doctor__name', 'doctor__specialty',
+        )
+
 
 class PatientDoctorMapping(models.Model):
     """
@@ -109,12 +199,235 @@ class PatientDoctorMapping(models.Model):
         blank=True,
         help_text="Additional notes about the assignment"
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = PatientDoctorMappingQuerySet.as_manager()
 
     class Meta:
         unique_together = ['patient', 'doctor']
         ordering = ['-assigned_date']
+        indexes = [
+            # Newest-first listings per doctor and per patient
+            models.Index(fields=['doctor', '-assigned_date', '-id'], name='mapping_doctor_assigned_idx'),
+            models.Index(fields=['patient', '-assigned_date', '-id'], name='mapping_patient_assigned_idx'),
+            models.Index(fields=['updated_at', 'id'], name='mapping_updated_idx'),
+        ]
         verbose_name = 'Patient-Doctor Assignment'
         verbose_name_plural = 'Patient-Doctor Assignments'
 
     def __str__(self):
-        return f"{self.patient.name} → Dr. {self.doctor.name}"
\ No newline at end of file
+        return f"{self.patient.name} → Dr. {self.doctor.name}"
+
+
+class Tombstone(models.Model):
+    """
+    Record of a patient or assignment that left a user's change feed,
+    because it was deleted or moved to another user.
+    """
+    PATIENT = 'patient'
+    MAPPING = 'mapping'
+    KIND_CHOICES = [
+        (PATIENT, 'Patient'),
+        (MAPPING, 'Patient-Doctor Assignment'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    # Plain column rather than a foreign key: tombstones are written while
+    # the owning user may itself be being deleted
+    user_id = models.IntegerField(help_text="The user whose feed the row left")
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'kind', 'deleted_at', 'id'], name='tombstone_feed_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} (user {self.user_id})"
+
+
+class SpecialtyStats(models.Model):
+    """
+    Doctor and assignment totals per specialty, kept current as doctors
+    and assignments change so workload dashboards read a handful of rows
+    instead of aggregating every assignment.
+    """
+    specialty = models.CharField(max_length=100, unique=True)
+    doctors = models.PositiveIntegerField(default=0)
+    assignments = models.PositiveIntegerField(default=0)
+    primary_assignments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['specialty']
+        verbose_name = 'Specialty Statistics'
+        verbose_name_plural = 'Specialty Statistics'
+
+    def __str__(self):
+        return f"{self.specialty}: {self.doctors} doctors, {self.assignments} assignments"
+
+
+class Job(models.Model):
+    """
+    Background job (import, export, recount...) run by manage.py run_workers.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='jobs',
+        help_text="The user who submitted the job"
+    )
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress_done = models.PositiveBigIntegerField(default=0)
+    progress_total = models.PositiveBigIntegerField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="host:pid:claim of the worker running the job"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers claim the oldest queued jobs first
+            models.Index(fields=['status', 'created_at', 'id'], name='job_queue_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='job_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} job {self.pk} ({self.status})"
+
+
+STAT_FIELDS = ('doctors', 'assignments', 'primary_assignments')
+
+
+def specialty_totals(doctors):
+    """
+    SpecialtyStats rows for the given doctors and their assignments, from
+    one GROUP BY.
+    """
+    return doctors.order_by().values('specialty').annotate(
+        doctors=Count('id', distinct=True),
+        assignments=Count('patient_assignments'),
+        primary_assignments=Count('patient_assignments', filter=Q(patient_assignments__is_primary=True)),
+    )
+
+
+def assignment_totals(assignments):
+    """
+    SpecialtyStats assignment rows for the given assignments, from one
+    GROUP BY on their doctors' specialties.
+    """
+    return assignments.order_by().values(specialty=F('doctor__specialty')).annotate(
+        assignments=Count('id'),
+        primary_assignments=Count('id', filter=Q(is_primary=True)),
+    )
+
+
+def adjust_specialty_stats(rows, sign=1, using=None):
+    """
+    Add (or with sign=-1 subtract) per-specialty dicts of STAT_FIELDS
+    deltas to the statistics.
+    """
+    for row in rows:
+        deltas = {field: F(field) + sign * row[field] for field in STAT_FIELDS if row.get(field)}
+        if not deltas:
+            continue
+        stats = SpecialtyStats.objects.using(using).filter(specialty=row['specialty'])
+        if not stats.update(**deltas):
+            SpecialtyStats.objects.using(using).get_or_create(specialty=row['specialty'])
+            stats.update(**deltas)
+
+
+def rebuild_specialty_stats():
+    """
+    Replace the statistics with totals recomputed from the doctors and
+    assignments tables.
+    """
+    with transaction.atomic():
+        SpecialtyStats.objects.all().delete()
+        SpecialtyStats.objects.bulk_create([SpecialtyStats(**row) for row in specialty_totals(Doctor.objects.all())])
+
+
+def touch_assignments(assignments):
+    """
+    Put the given assignments back in the change feed, whose rows repeat
+    the patient's name and the doctor's name and specialty.
+    """
+    return assignments.update(updated_at=timezone.now())
+
+
+# Rows per INSERT in insert_assignments, well under SQLite's parameter limit
+INSERT_BATCH_SIZE = 1000
+
+
+def insert_assignments(mappings):
+    """
+    Insert new mappings, skipping pairs that already exist, and return the
+    ones actually written, with their ids set. Unlike
+    bulk_create(ignore_conflicts=True), this tells apart pairs another
+    transaction inserted since the caller looked them up.
+    """
+    fields = [f for f in PatientDoctorMapping._meta.concrete_fields if not f.primary_key]
+    table = connection.ops.quote_name(PatientDoctorMapping._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(f.column) for f in fields)
+    row = f'({", ".join(["%s"] * len(fields))})'
+    inserted = []
+    with connection.cursor() as cursor:
+        for start in range(0, len(mappings), INSERT_BATCH_SIZE):
+            batch = mappings[start:start + INSERT_BATCH_SIZE]
+            by_pair = {(m.patient_id, m.doctor_id): m for m in batch}
+            # PostgreSQL and SQLite 3.35+ both return only the rows inserted
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([row] * len(batch))} '
+                f'ON CONFLICT DO NOTHING RETURNING id, patient_id, doctor_id',
+                [f.get_db_prep_save(f.pre_save(m, add=True), connection) for m in batch for f in fields],
+            )
+            for pk, patient_id, doctor_id in cursor.fetchall():
+                mapping = by_pair[(patient_id, doctor_id)]
+                mapping.pk = pk
+                mapping._state.adding = False
+                inserted.append(mapping)
+    return inserted
+
+
+def recount_assignments(mappings):
+    """
+    Recompute the counters of the patients and doctors touched by the given
+    new mappings and add them to the specialty statistics. Used after bulk
+    writes, which send no model signals.
+    """
+    # doctor_count is part of the patient, so the change feed has to see it move
+    Patient.objects.filter(pk__in={m.patient_id for m in mappings}).recount_doctors(updated_at=timezone.now())
+    doctors = Doctor.objects.filter(pk__in={m.doctor_id for m in mappings})
+    doctors.recount_patients()
+    specialties = dict(doctors.values_list('id', 'specialty'))
+    assignments, primary = Counter(), Counter()
+    for mapping in mappings:
+        assignments[specialties[mapping.doctor_id]] += 1
+        primary[specialties[mapping.doctor_id]] += mapping.is_primary
+    adjust_specialty_stats([
+        {'specialty': specialty, 'assignments': count, 'primary_assignments': primary[specialty]}
+        for specialty, count in assignments.items()
+    ])
@@ -0,0 +1,205 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, FieldError, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over the model's default ordering.
+
+    The cursor stores the ordering values of the last row served plus its
+    primary key as a tiebreaker, so every page is a bounded range scan
+    instead of an OFFSET that grows with the page number.
+    """
+    # Query parameters are read from request.GET, which DRF requests proxy,
+    # so the same paginator also serves plain Django async views.
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        page_size = api_settings.PAGE_SIZE or 50
+        max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', page_size)
+        requested = request.GET.get(self.page_size_query_param)
+        if requested:
+            try:
+                requested = int(requested)
+            except ValueError:
+                requested = 0
+            if requested > 0:
+                page_size = requested
+        return min(page_size, max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+        Return the ordering as (field, descending) pairs, ending with the
+        primary key so that rows with equal values keep a stable order.
+        """
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or [])
+        pairs = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+        pk_name = queryset.model._meta.pk.name
+        if not any(field in (pk_name, 'pk') for field, _ in pairs):
+            descending = pairs[0][1] if pairs else False
+            pairs.append((pk_name, descending))
+        return pairs
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        return self.get_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async counterpart of paginate_queryset for plain Django async views.
+        """
+        queryset = self.get_page_queryset(queryset, request)
+        return self.get_page([row async for row in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Narrow the queryset to the rows after the cursor, one row past the
+        page size so we know whether another page follows.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+
+        self.position, self.reverse = self.decode_cursor(request, queryset)
+        ordering = [(field, desc != self.reverse) for field, desc in self.ordering]
+        if self.position is not None:
+            queryset = queryset.filter(self.get_position_filter(ordering, self.position))
+        queryset = queryset.order_by(*[('-' if desc else '') + field for field, desc in ordering])
+        return queryset[:self.page_size + 1]
+
+    def get_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        # Moving backwards, "more" lies before this page and the cursor we
+        # came from guarantees a page after it, and vice versa.
+        if self.reverse:
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = self.position is not None, has_more
+        self.page = results
+        return results
+
+    def get_position_filter(self, ordering, position):
+        """
+        Build the row-value comparison (a, b, id) > (x, y, z) as the
+        equivalent OR of prefix equalities, honouring each field's direction.
+        """
+        clauses = []
+        for index, (field, desc) in enumerate(ordering):
+            lookup = {prev: position[i] for i, (prev, _) in enumerate(ordering[:index])}
+            lookup[f'{field}__{"lt" if desc else "gt"}'] = position[index]
+            clauses.append(Q(**lookup))
+        return reduce(or_, clauses)
+
+    def get_position(self, instance):
+        position = []
+        for field, _ in self.ordering:
+            if isinstance(instance, dict):
+                # Row from a .values() queryset
+                value = instance[field]
+            else:
+                value = instance
+                for attr in field.split('__'):
+                    value = getattr(value, attr)
+            if hasattr(value, 'isoformat'):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def get_ordering_fields(self, queryset):
+        """
+        The model field (or annotation output field) behind each ordering
+        entry, None where it cannot be resolved.
+        """
+        fields = []
+        for name, _ in self.ordering:
+            try:
+                if name in queryset.query.annotations:
+                    field = queryset.query.annotations[name].output_field
+                else:
+                    model = queryset.model
+                    for part in name.split('__'):
+                        field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+                        model = field.related_model
+            except (FieldDoesNotExist, FieldError):
+                field = None
+            fields.append(field)
+        return fields
+
+    def decode_cursor(self, request, queryset):
+        """
+        Return the position (ordering values of the last row served) and
+        direction in the ?cursor= parameter, raising NotFound when it was
+        tampered with or no longer fits the ordering.
+        """
+        encoded = request.GET.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            position, reverse = data['p'], bool(data.get('r'))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError(position)
+            values = []
+            for field, value in zip(self.get_ordering_fields(queryset), position):
+                if value is None or isinstance(value, (dict, list)):
+                    raise ValueError(value)
+                values.append(value if field is None else field.to_python(value))
+        except (TypeError, ValueError, KeyError, UnicodeError, AttributeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({'p': position, 'r': int(reverse)}, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
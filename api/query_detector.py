@@ -0,0 +1,149 @@
+"""
+Development and CI aid that groups the SQL run during a request by
+statement shape and reports N+1 patterns and slow queries, pointing at
+the line of application code that issued them.
+
+Enabled through the QUERY_DETECTOR setting ('warn' logs, 'strict' raises
+QueryProblemsError so the request, and any test making it, fails).
+"""
+import logging
+import re
+import time
+import traceback
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.queries')
+
+APP_DIR = Path(__file__).resolve().parent
+# Frames from these modules are plumbing, not the code that caused a query
+IGNORED_FILES = {
+    str(Path(__file__).resolve()),
+    str(Path(__file__).resolve().with_name('middleware.py')),
+}
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?|\d+)\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+TRANSACTION_RE = re.compile(r'^\s*(SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT|BEGIN|COMMIT)\b', re.IGNORECASE)
+
+
+class QueryProblemsError(Exception):
+    pass
+
+
+def normalize_sql(sql):
+    """
+    Reduce a statement to its shape: literals become ?, IN lists of any
+    length become IN (...), whitespace is collapsed.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('IN (...)', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def caller_frame(depth=3):
+    """
+    The innermost frames of the api package, outside the detector itself,
+    that led to the current query, formatted as
+    'api/serializers.py:42 in to_representation <- api/views.py:88 in list'.
+    """
+    frames = []
+    for frame in reversed(traceback.extract_stack()):
+        path = Path(frame.filename)
+        if frame.filename in IGNORED_FILES or not path.is_relative_to(APP_DIR):
+            continue
+        frames.append(f'{path.relative_to(APP_DIR.parent)}:{frame.lineno} in {frame.name}')
+        if len(frames) == depth:
+            break
+    return ' <- '.join(frames) or None
+
+
+class QueryDetector:
+    """
+    connection.execute_wrapper that records every statement by shape.
+    """
+    def __init__(self, repeat_threshold=None, slow_ms=None):
+        self.repeat_threshold = repeat_threshold or settings.QUERY_DETECTOR_REPEAT_THRESHOLD
+        self.slow_ms = slow_ms if slow_ms is not None else settings.QUERY_DETECTOR_SLOW_MS
+        self.shapes = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            ms = (time.perf_counter() - started) * 1000
+            if not TRANSACTION_RE.match(sql):
+                shape = normalize_sql(sql)
+                entry = self.shapes.get(shape)
+                if entry is None:
+                    self.shapes[shape] = entry = {'count': 0, 'ms': 0.0, 'caller': caller_frame()}
+                entry['count'] += 1
+                entry['ms'] += ms
+                if ms >= self.slow_ms:
+                    self.slow.append({'sql': shape, 'ms': round(ms, 2), 'caller': caller_frame()})
+
+    def problems(self):
+        """
+        The repeated statement shapes and slow queries seen so far.
+        """
+        found = [
+            {'type': 'repeated', 'sql': shape, 'count': entry['count'],
+             'ms': round(entry['ms'], 2), 'caller': entry['caller']}
+            for shape, entry in self.shapes.items()
+            if entry['count'] >= self.repeat_threshold
+        ]
+        found.extend({'type': 'slow', **query} for query in self.slow)
+        return found
+
+
+def format_problems(label, problems):
+    lines = [f'{len(problems)} query problem(s) in {label}:']
+    for problem in problems:
+        if problem['type'] == 'repeated':
+            lines.append(
+                f"  {problem['count']}x the same statement ({problem['ms']} ms total) "
+                f"from {problem['caller'] or 'unknown caller'}: {problem['sql']}"
+            )
+        else:
+            lines.append(
+                f"  slow query ({problem['ms']} ms) "
+                f"from {problem['caller'] or 'unknown caller'}: {problem['sql']}"
+            )
+    return '\n'.join(lines)
+
+
+def check(label, detector, mode):
+    """
+    Log the detector's findings, raising in strict mode.
+    """
+    problems = detector.problems()
+    if not problems:
+        return
+    message = format_problems(label, problems)
+    if mode == 'strict':
+        raise QueryProblemsError(message)
+    logger.warning(message)
+
+
+@contextmanager
+def detect_queries(label='block', mode='strict', **thresholds):
+    """
+    Check the queries run inside the block, e.g. in a test:
+
+        with detect_queries('doctor list'):
+            client.get('/api/doctors/')
+    """
+    detector = QueryDetector(**thresholds)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(detector))
+        yield detector
+    check(label, detector, mode)
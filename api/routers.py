@@ -0,0 +1,70 @@
+"""
+Read-replica routing for the API viewsets.
+
+ReplicaReadMixin picks a replica for each eligible GET request and stores
+it in read_alias; ReplicaRouter sends that request's reads there. Reads
+outside such requests, and every write, go to the primary.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+# Database alias serving the current request's reads; None means the primary
+read_alias = ContextVar('read_alias', default=None)
+
+PIN_KEY = 'db:pin:{}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def choose_replica():
+    return random.choice(settings.DATABASE_REPLICAS) if settings.DATABASE_REPLICAS else None
+
+
+def current_read_alias():
+    """
+    Alias the current request reads from, for querysets evaluated after
+    the view returns (streamed exports).
+    """
+    return read_alias.get() or DEFAULT_DB_ALIAS
+
+
+def pin_to_primary(user_id):
+    """
+    Keep the user's reads on the primary until replicas have caught up
+    with the write they just made.
+    """
+    cache.set(PIN_KEY.format(user_id), True, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user_id):
+    return cache.get(PIN_KEY.format(user_id)) is not None
+
+
+@contextmanager
+def use_primary():
+    """
+    Read from the primary inside the block, e.g. to fill a shared cache.
+    """
+    token = read_alias.set(None)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
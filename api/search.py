@@ -0,0 +1,90 @@
+"""
+Ranked doctor search backed by the indexes from migrations 0004 and 0010:
+PostgreSQL full-text search on a stored tsvector column plus trigram
+similarity on the name, or an FTS5 table on SQLite. Other backends fall
+back to an unindexed icontains.
+"""
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'simple'
+
+# SQLite drops triggers whenever a migration rebuilds api_doctor, so these
+# are recreated after every migrate (see api.signals)
+SQLITE_FTS_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_insert AFTER INSERT ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_delete AFTER DELETE ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS api_doctor_fts_update
+    AFTER UPDATE OF name, specialty, license_number ON api_doctor BEGIN
+        INSERT INTO api_doctor_fts(api_doctor_fts, rowid, name, specialty, license_number)
+        VALUES ('delete', old.id, old.name, old.specialty, old.license_number);
+        INSERT INTO api_doctor_fts(rowid, name, specialty, license_number)
+        VALUES (new.id, new.name, new.specialty, new.license_number);
+    END
+    """,
+]
+
+
+def fts5_query(q):
+    """
+    Turn free text into an FTS5 query of quoted prefix terms, so user
+    input can never be parsed as FTS5 syntax.
+    """
+    terms = [term.replace('"', '""') for term in q.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_doctors(queryset, q):
+    """
+    Filter the queryset to doctors matching q and annotate a relevance
+    rank, higher being better.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
+        # Generated column from migration 0010, unknown to the model
+        vector = RawSQL('"api_doctor"."search_vector"', [], output_field=SearchVectorField())
+        query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+        return queryset.alias(search=vector).filter(
+            Q(search=query) | Q(name__trigram_similar=q)
+        ).annotate(
+            rank=SearchRank(vector, query) + TrigramSimilarity('name', q)
+        )
+    if vendor == 'sqlite':
+        # Join the FTS5 table so MATCH runs once per query, and take bm25
+        # from its rank column rather than re-matching for every row
+        return queryset.extra(
+            tables=['api_doctor_fts'],
+            where=['"api_doctor_fts"."rowid" = "api_doctor"."id"', '"api_doctor_fts" MATCH %s'],
+            params=[fts5_query(q)],
+        ).annotate(
+            rank=RawSQL('-"api_doctor_fts"."rank"', (), output_field=FloatField())
+        )
+    return queryset.filter(
+        Q(name__icontains=q) | Q(specialty__icontains=q) | Q(license_number__icontains=q)
+    ).annotate(rank=Value(0.0, output_field=FloatField()))
+
+
+def ensure_sqlite_fts_triggers(connection):
+    """
+    Recreate the FTS5 sync triggers if a table rebuild dropped them.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    if 'api_doctor_fts' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in SQLITE_FTS_TRIGGERS_SQL:
+            cursor.execute(sql)
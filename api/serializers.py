@@ -1,7 +1,10 @@
+from functools import lru_cache
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth.password_validation import validate_password
-from .models import Patient, Doctor, PatientDoctorMapping
+from .models import Patient, Doctor, PatientDoctorMapping, SpecialtyStats, Job
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -66,22 +69,33 @@ class DoctorSerializer(serializers.ModelSerializer):
     """
     Serializer for Doctor model with validation.
     """
-    patient_count = serializers.SerializerMethodField()
+    patient_count = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Doctor
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at')
 
-    def get_patient_count(self, obj):
-        return obj.patient_assignments.count()
-
     def validate_years_of_experience(self, value):
         if value < 0 or value > 70:
             raise serializers.ValidationError("Years of experience must be between 0 and 70.")
         return value
 
 
+class DoctorBulkSerializer(DoctorSerializer):
+    """
+    Serializer for one row of a bulk doctor upsert.
+    Same field rules as DoctorSerializer, but license_number uniqueness is
+    resolved by the view for the whole batch instead of one query per row.
+    """
+    class Meta:
+        model = Doctor
+        fields = ('name', 'specialty', 'license_number', 'phone', 'email', 'years_of_experience')
+        extra_kwargs = {
+            'license_number': {'validators': []}
+        }
+
+
 class PatientDoctorMappingSerializer(serializers.ModelSerializer):
     """
     Serializer for Patient-Doctor mapping.
@@ -102,35 +116,159 @@ class PatientDoctorMappingSerializer(serializers.ModelSerializer):
         # Check if the patient belongs to the current user
         if hasattr(self, 'context') and 'request' in self.context:
             request = self.context['request']
-            if patient.user != request.user:
+            if patient.user_id != request.user.id:
                 raise serializers.ValidationError("You can only assign doctors to your own patients.")
         
         return attrs
 
 
+class PatientDoctorMappingBulkSerializer(serializers.Serializer):
+    """
+    Serializer for one row of a bulk assignment request.
+    Ownership and doctor existence are checked by the view for the whole batch.
+    """
+    patient = serializers.IntegerField(min_value=1)
+    doctor = serializers.IntegerField(min_value=1)
+    is_primary = serializers.BooleanField(default=False)
+    notes = serializers.CharField(allow_blank=True, default='')
+
+
 class PatientListSerializer(serializers.ModelSerializer):
     """
     Simplified serializer for patient list view.
     """
-    doctor_count = serializers.SerializerMethodField()
-    
     class Meta:
         model = Patient
         fields = ('id', 'name', 'age', 'phone', 'doctor_count', 'created_at')
 
-    def get_doctor_count(self, obj):
-        return obj.doctor_assignments.count()
-
 
 class DoctorListSerializer(serializers.ModelSerializer):
     """
     Simplified serializer for doctor list view.
     """
-    patient_count = serializers.SerializerMethodField()
-    
     class Meta:
         model = Doctor
         fields = ('id', 'name', 'specialty', 'phone', 'patient_count', 'years_of_experience')
 
-    def get_patient_count(self, obj):
-        return obj.patient_assignments.count()
\ No newline at end of file
+
+class DoctorSearchSerializer(DoctorListSerializer):
+    """
+    Doctor list serializer with the search relevance rank.
+    """
+    rank = serializers.FloatField(read_only=True, default=None)
+
+    class Meta(DoctorListSerializer.Meta):
+        fields = DoctorListSerializer.Meta.fields + ('rank',)
+
+
+class SpecialtyStatsSerializer(serializers.ModelSerializer):
+    """
+    Workload of one specialty, from the SpecialtyStats summary table.
+    """
+    secondary_assignments = serializers.SerializerMethodField()
+    patients_per_doctor = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SpecialtyStats
+        fields = (
+            'specialty', 'doctors', 'assignments', 'primary_assignments',
+            'secondary_assignments', 'patients_per_doctor',
+        )
+
+    def get_secondary_assignments(self, obj):
+        return obj.assignments - obj.primary_assignments
+
+    def get_patients_per_doctor(self, obj):
+        return round(obj.assignments / obj.doctors, 2) if obj.doctors else 0
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Status and progress of a background job.
+    """
+    class Meta:
+        model = Job
+        fields = (
+            'id', 'kind', 'params', 'status', 'progress_done', 'progress_total', 'result',
+            'error', 'attempts', 'created_at', 'started_at', 'finished_at',
+        )
+        read_only_fields = fields
+
+
+class ImportJobSerializer(serializers.Serializer):
+    """
+    Parameters of an import job: the uploaded CSV or NDJSON file and what it holds.
+    """
+    model = serializers.ChoiceField(choices=['patients', 'doctors', 'mappings'])
+    format = serializers.ChoiceField(choices=['csv', 'ndjson'], required=False)
+    file = serializers.FileField()
+
+    def validate(self, attrs):
+        if 'format' not in attrs:
+            attrs['format'] = 'csv' if attrs['file'].name.lower().endswith('.csv') else 'ndjson'
+        return attrs
+
+
+class ExportJobSerializer(serializers.Serializer):
+    """
+    Parameters of an export job.
+    """
+    model = serializers.ChoiceField(choices=['patients', 'mappings'])
+    format = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+
+
+# Field types whose to_representation returns a value fetched with
+# .values() unchanged, so the fast path copies it as is
+PLAIN_FIELD_TYPES = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ValuesRepresentation:
+    """
+    Read-only fast path for a list serializer: the columns it outputs are
+    fetched with .values() and mapped straight to output dicts, without
+    model instances and without calling to_representation for plain
+    values. The output is the same as serializer_class(rows, many=True).data.
+    """
+    def __init__(self, serializer_class):
+        self.columns = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or isinstance(field, (serializers.SerializerMethodField, serializers.Serializer)):
+                raise ImproperlyConfigured(
+                    f'{serializer_class.__name__}.{name} cannot be read with .values()'
+                )
+            convert = None if isinstance(field, PLAIN_FIELD_TYPES) else field.to_representation
+            self.columns.append((name, '__'.join(field.source_attrs), convert))
+        self.lookups = [lookup for _, lookup, _ in self.columns]
+
+    def values(self, queryset):
+        """
+        The queryset as dicts holding the serializer's columns plus the
+        ordering fields that keyset pagination reads.
+        """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or []
+        fields = [field.lstrip('-') for field in ordering if isinstance(field, str)]
+        extra = [field for field in fields if field not in self.lookups and field != 'pk']
+        return queryset.values(*self.lookups, *extra)
+
+    def to_representation(self, rows):
+        columns = self.columns
+        data = []
+        for row in rows:
+            item = {}
+            for name, lookup, convert in columns:
+                value = row[lookup]
+                item[name] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+@lru_cache(maxsize=None)
+def values_representation(serializer_class):
+    return ValuesRepresentation(serializer_class)
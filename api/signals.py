@@ -0,0 +1,251 @@
+from django.contrib.auth.models import User
+from django.db.models import F, QuerySet
+from django.db import connections
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, post_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import revoke_user, user_cache
+from .cache import bump_doctor_version, invalidate_owned_patients
+from .changes import record_tombstones
+from .models import (
+    Patient,
+    Doctor,
+    PatientDoctorMapping,
+    Tombstone,
+    adjust_specialty_stats,
+    assignment_totals,
+    specialty_totals,
+    touch_assignments
+)
+from .search import ensure_sqlite_fts_triggers
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+@receiver([post_save, post_delete], sender=PatientDoctorMapping)
+def invalidate_doctor_cache(sender, **kwargs):
+    # Doctor responses include patient counts, so assignments count too
+    bump_doctor_version()
+
+
+def adjust_assignment_counts(patient_id, doctor_id, delta):
+    # doctor_count is part of the patient, so the change feed has to see it move
+    Patient.objects.filter(pk=patient_id).update(doctor_count=F('doctor_count') + delta, updated_at=timezone.now())
+    Doctor.objects.filter(pk=doctor_id).update(patient_count=F('patient_count') + delta)
+
+
+@receiver(pre_save, sender=PatientDoctorMapping)
+def remember_assignment_pair(sender, instance, raw=False, **kwargs):
+    # Updates may move an assignment to another patient or doctor
+    if instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'patient_id', 'doctor_id', 'doctor__specialty', 'is_primary'
+        ).first()
+        if previous:
+            instance._previous_pair, instance._previous_stats = previous[:2], previous[2:]
+
+
+@receiver(post_save, sender=PatientDoctorMapping)
+def count_saved_assignment(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        adjust_assignment_counts(instance.patient_id, instance.doctor_id, 1)
+        return
+    previous = getattr(instance, '_previous_pair', None)
+    if previous and previous != (instance.patient_id, instance.doctor_id):
+        adjust_assignment_counts(*previous, -1)
+        adjust_assignment_counts(instance.patient_id, instance.doctor_id, 1)
+        if previous[0] != instance.patient_id:
+            owners = dict(Patient.objects.filter(pk__in=[previous[0], instance.patient_id]).values_list('id', 'user_id'))
+            if owners.get(previous[0]) not in (None, owners.get(instance.patient_id)):
+                # Moved to another user's patient: gone from the old owner's feed
+                record_tombstones(Tombstone.MAPPING, owners[previous[0]], [instance.pk])
+
+
+def deleted_in_cascade(origin):
+    """
+    Whether assignments are being deleted along with their patient, doctor
+    or user, whose pre_delete receivers adjust for all of them at once.
+    """
+    if origin is None:
+        return False
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is not PatientDoctorMapping
+
+
+@receiver(post_delete, sender=PatientDoctorMapping)
+def count_deleted_assignment(sender, instance, origin=None, **kwargs):
+    if not deleted_in_cascade(origin):
+        adjust_assignment_counts(instance.patient_id, instance.doctor_id, -1)
+
+
+@receiver(post_delete, sender=PatientDoctorMapping)
+def bury_deleted_assignment(sender, instance, using, origin=None, **kwargs):
+    if deleted_in_cascade(origin):
+        return
+    if PatientDoctorMapping.patient.is_cached(instance):
+        user_id = instance.patient.user_id
+    else:
+        user_id = Patient.objects.using(using).filter(pk=instance.patient_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        record_tombstones(Tombstone.MAPPING, user_id, [instance.pk], using)
+
+
+def assignment_stats(specialty, is_primary, sign=1, using=None):
+    adjust_specialty_stats([
+        {'specialty': specialty, 'assignments': 1, 'primary_assignments': int(is_primary)}
+    ], sign, using)
+
+
+def assignment_specialty(instance, using=None):
+    if PatientDoctorMapping.doctor.is_cached(instance):
+        return instance.doctor.specialty
+    return Doctor.objects.using(using).filter(pk=instance.doctor_id).values_list('specialty', flat=True).first()
+
+
+@receiver(post_save, sender=PatientDoctorMapping)
+def add_assignment_stats(sender, instance, created, raw=False, using=None, **kwargs):
+    previous = getattr(instance, '_previous_stats', None)
+    if raw or not (created or previous):
+        return
+    if previous and instance._previous_pair[1] == instance.doctor_id:
+        specialty = previous[0]
+    else:
+        specialty = assignment_specialty(instance, using)
+    if previous == (specialty, instance.is_primary):
+        return
+    if previous:
+        assignment_stats(*previous, -1, using)
+    assignment_stats(specialty, instance.is_primary, 1, using)
+
+
+@receiver(post_delete, sender=PatientDoctorMapping)
+def remove_assignment_stats(sender, instance, using, origin=None, **kwargs):
+    if deleted_in_cascade(origin):
+        return
+    specialty = assignment_specialty(instance, using)
+    if specialty is not None:
+        assignment_stats(specialty, instance.is_primary, -1, using)
+
+
+@receiver(post_save, sender=Doctor)
+def touch_renamed_doctor_assignments(sender, instance, created, raw=False, using=None, **kwargs):
+    # Connected before add_doctor_stats, which resets _loaded_specialty
+    previous = (getattr(instance, '_loaded_name', None), getattr(instance, '_loaded_specialty', None))
+    if not (created or raw) and None not in previous and previous != (instance.name, instance.specialty):
+        touch_assignments(PatientDoctorMapping.objects.using(using).filter(doctor_id=instance.pk))
+    instance._loaded_name = instance.name
+
+
+@receiver(post_save, sender=Doctor)
+def add_doctor_stats(sender, instance, created, raw=False, using=None, **kwargs):
+    previous = getattr(instance, '_loaded_specialty', None)
+    if raw:
+        pass
+    elif created:
+        adjust_specialty_stats([{'specialty': instance.specialty, 'doctors': 1}], using=using)
+    elif previous is not None and previous != instance.specialty:
+        # Move the doctor and all of their assignments to the new specialty
+        totals = list(specialty_totals(Doctor.objects.using(using).filter(pk=instance.pk)))
+        adjust_specialty_stats([{**row, 'specialty': previous} for row in totals], -1, using)
+        adjust_specialty_stats(totals, 1, using)
+    instance._loaded_specialty = instance.specialty
+
+
+@receiver(pre_delete, sender=Doctor)
+def remove_doctor_assignments(sender, instance, using, **kwargs):
+    """
+    Adjust the counters, feeds and statistics for all of the doctor's
+    assignments before the cascade deletes them, in a few aggregated
+    queries instead of a few per assignment.
+    """
+    assignments = PatientDoctorMapping.objects.using(using).filter(doctor_id=instance.pk)
+    rows = list(assignments.values_list('id', 'patient__user_id'))
+    if not rows:
+        return
+    # doctor_count is part of the patient, so the change feed has to see it move
+    Patient.objects.using(using).filter(doctor_assignments__doctor_id=instance.pk).update(
+        doctor_count=F('doctor_count') - 1, updated_at=timezone.now()
+    )
+    Tombstone.objects.using(using).bulk_create([
+        Tombstone(kind=Tombstone.MAPPING, object_id=pk, user_id=user_id) for pk, user_id in rows
+    ])
+    adjust_specialty_stats(assignment_totals(assignments), -1, using)
+
+
+@receiver(post_delete, sender=Doctor)
+def remove_doctor_stats(sender, instance, using, **kwargs):
+    # The doctor's assignments were already subtracted by remove_doctor_assignments
+    adjust_specialty_stats([{'specialty': instance.specialty, 'doctors': 1}], -1, using)
+
+
+@receiver(post_save, sender=Patient)
+def refresh_patient_owner(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_loaded_user_id', None)
+    if created or raw:
+        invalidate_owned_patients(instance.user_id)
+    elif previous is not None and previous != instance.user_id:
+        invalidate_owned_patients(previous, instance.user_id)
+        move_patient_feed(instance, previous)
+    instance._loaded_user_id = instance.user_id
+
+
+@receiver(post_save, sender=Patient)
+def touch_renamed_patient_assignments(sender, instance, created, raw=False, using=None, **kwargs):
+    previous = getattr(instance, '_loaded_name', None)
+    if not (created or raw) and previous is not None and previous != instance.name:
+        touch_assignments(PatientDoctorMapping.objects.using(using).filter(patient_id=instance.pk))
+    instance._loaded_name = instance.name
+
+
+def move_patient_feed(patient, previous_user_id):
+    """
+    Take a reassigned patient and its assignments out of the previous
+    owner's change feed and put them in the new owner's.
+    """
+    assignments = PatientDoctorMapping.objects.filter(patient_id=patient.pk)
+    record_tombstones(Tombstone.PATIENT, previous_user_id, [patient.pk])
+    record_tombstones(Tombstone.MAPPING, previous_user_id, list(assignments.values_list('id', flat=True)))
+    touch_assignments(assignments)
+
+
+@receiver(pre_delete, sender=Patient)
+def remove_patient_assignments(sender, instance, using, **kwargs):
+    """
+    The patient's side of remove_doctor_assignments.
+    """
+    assignments = PatientDoctorMapping.objects.using(using).filter(patient_id=instance.pk)
+    ids = list(assignments.values_list('id', flat=True))
+    if not ids:
+        return
+    Doctor.objects.using(using).filter(patient_assignments__patient_id=instance.pk).update(
+        patient_count=F('patient_count') - 1
+    )
+    record_tombstones(Tombstone.MAPPING, instance.user_id, ids, using)
+    adjust_specialty_stats(assignment_totals(assignments), -1, using)
+
+
+@receiver(post_delete, sender=Patient)
+def forget_patient_owner(sender, instance, using, **kwargs):
+    invalidate_owned_patients(instance.user_id)
+    record_tombstones(Tombstone.PATIENT, instance.user_id, [instance.pk], using)
+
+
+@receiver(post_save, sender=User)
+def refresh_token_user(sender, instance, **kwargs):
+    user_cache.pop(instance.pk)
+    if not instance.is_active:
+        # Stateless authentication never re-reads is_active from the database
+        revoke_user(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def revoke_deleted_user(sender, instance, **kwargs):
+    revoke_user(instance.pk)
+
+
+@receiver(post_migrate)
+def restore_doctor_search_triggers(sender, using, **kwargs):
+    if sender.name == 'api':
+        ensure_sqlite_fts_triggers(connections[using])
@@ -0,0 +1,1128 @@
+import base64
+import csv
+import io
+import json
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from unittest import mock, skipUnless
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Case, DecimalField, OuterRef, QuerySet, Subquery, Value, When
+from django.db.models.functions import TruncDate
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import serializers
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .authentication import RevocableJWTAuthentication, deny_list
+from .middleware import QueryDetectorMiddleware
+from .models import (
+    Doctor, Job, Patient, PatientDoctorMapping, SpecialtyStats, Tombstone, insert_assignments, specialty_totals,
+)
+from .cache import filter_owned_patients
+from .jobs import claim_jobs, release_jobs, requeue_stale_jobs, run_job
+from .query_detector import QueryProblemsError, detect_queries
+from .renderers import FastJSONParser, FastJSONRenderer
+from .routers import current_read_alias, read_alias, use_primary
+from .serializers import (
+    DoctorListSerializer,
+    PatientDoctorMappingSerializer,
+    PatientListSerializer,
+    ValuesRepresentation,
+)
+from .throttling import get_store
+
+
+@override_settings(QUERY_DETECTOR='strict')
+class APITestCase(TestCase):
+    """
+    Two users, a client authenticated as the first, and empty caches and
+    throttle buckets for every test. Requests fail on an N+1 pattern or a
+    slow query.
+    """
+    def setUp(self):
+        cache.clear()
+        get_store.cache_clear()
+        self.user = User.objects.create_user('alice', password='pw')
+        self.other = User.objects.create_user('bob', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count, user=None, doctors_per_patient=2):
+        """
+        count doctors and count patients of user (default: self.user), each
+        patient assigned to the first doctors_per_patient doctors.
+        """
+        start = Doctor.objects.count()
+        doctors = [
+            Doctor.objects.create(
+                name=f'Doctor {i}', specialty='Cardiology', license_number=f'LIC{i}',
+                phone='555-0100', email=f'doctor{i}@example.com',
+            )
+            for i in range(start, start + count)
+        ]
+        patients = [
+            Patient.objects.create(user=user or self.user, name=f'Patient {i}', age=40, address='1 Main St')
+            for i in range(count)
+        ]
+        for patient in patients:
+            for doctor in doctors[:doctors_per_patient]:
+                PatientDoctorMapping.objects.create(patient=patient, doctor=doctor)
+        return patients, doctors
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def assertConstantQueries(self, url, add_rows, rows=20):
+        """
+        Fail when url runs more queries once add_rows(count) has added
+        rows than it did with a single row, i.e. on an N+1 pattern.
+        """
+        add_rows(1)
+        single = self.count_queries(url)
+        add_rows(rows - 1)
+        self.assertEqual(
+            self.count_queries(url), single,
+            f'{url} runs more queries with {rows} rows than with one',
+        )
+
+
+class QueryCountTests(APITestCase):
+    """
+    The number of queries behind each list and detail endpoint, which must
+    not grow with the rows on the page.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(5)
+        self.mapping = PatientDoctorMapping.objects.first()
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response
+
+    def test_patient_list(self):
+        # Last-Modified/count for the conditional headers, then the page
+        response = self.get('/api/patients/', 2)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_patient_detail(self):
+        # The owner's patient index, the patient, its user
+        self.get(f'/api/patients/{self.patients[0].id}/', 3)
+        self.get(f'/api/patients/{self.patients[1].id}/', 2)
+
+    def test_doctor_list(self):
+        response = self.get('/api/doctors/', 1)
+        self.assertEqual(len(response.json()['results']), 5)
+        # The validator comes from the cache, and so does the page
+        self.get('/api/doctors/', 0)
+
+    def test_doctor_detail(self):
+        self.get(f'/api/doctors/{self.doctors[0].id}/', 2)
+
+    def test_mapping_list(self):
+        response = self.get('/api/mappings/', 1)
+        self.assertEqual(len(response.json()['results']), 10)
+
+    def test_mapping_detail(self):
+        self.get(f'/api/mappings/{self.mapping.id}/', 1)
+
+    def test_nested_lists(self):
+        # The ownership check loads the patient index once, then the page
+        self.get(f'/api/patients/{self.patients[0].id}/doctors/', 2)
+        self.get(f'/api/doctors/{self.doctors[0].id}/patients/', 2)
+        self.get(f'/api/mappings/patient/{self.patients[0].id}/', 1)
+
+
+class ConstantQueryTests(APITestCase):
+    """
+    List endpoints run as many queries for a full page as for one row.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patient = Patient.objects.create(user=self.user, name='Fixed', age=50, address='1 Main St')
+        self.doctor = Doctor.objects.create(
+            name='Fixed', specialty='Neurology', license_number='FIXED', phone='555-0100',
+            email='fixed@example.com',
+        )
+        self.added = 0
+
+    def add_rows(self, count):
+        """
+        Add count patients assigned to self.doctor and count doctors
+        assigned to self.patient.
+        """
+        for i in range(self.added, self.added + count):
+            doctor = Doctor.objects.create(
+                name=f'Doctor {i}', specialty='Cardiology', license_number=f'LIC{i}',
+                phone='555-0100', email=f'doctor{i}@example.com',
+            )
+            patient = Patient.objects.create(user=self.user, name=f'Patient {i}', age=40, address='1 Main St')
+            PatientDoctorMapping.objects.create(patient=self.patient, doctor=doctor)
+            PatientDoctorMapping.objects.create(patient=patient, doctor=self.doctor)
+        self.added += count
+
+    def test_patient_list(self):
+        self.assertConstantQueries('/api/patients/', self.add_rows)
+
+    def test_doctor_list(self):
+        self.assertConstantQueries('/api/doctors/', self.add_rows)
+
+    def test_mapping_list(self):
+        self.assertConstantQueries('/api/mappings/', self.add_rows)
+
+    def test_patient_doctors(self):
+        self.assertConstantQueries(f'/api/patients/{self.patient.id}/doctors/', self.add_rows)
+
+    def test_doctor_patients(self):
+        self.assertConstantQueries(f'/api/doctors/{self.doctor.id}/patients/', self.add_rows)
+
+    def test_mappings_by_patient(self):
+        self.assertConstantQueries(f'/api/mappings/patient/{self.patient.id}/', self.add_rows)
+
+
+class DoctorCacheTests(APITestCase):
+    """
+    Cached doctor responses are dropped once a doctor or assignment write
+    commits.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(2, doctors_per_patient=1)
+
+    def get(self, url, cache_status):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response['X-Cache'], cache_status, url)
+        return response.json()
+
+    def patient_counts(self):
+        return {row['id']: row['patient_count'] for row in self.get('/api/doctors/', 'MISS')['results']}
+
+    def test_hit(self):
+        url = f'/api/doctors/{self.doctors[0].id}/'
+        self.assertEqual(self.get(url, 'MISS'), self.get(url, 'HIT'))
+        self.get('/api/doctors/', 'MISS')
+        self.get('/api/doctors/', 'HIT')
+        # Every URL has its own entry
+        self.get('/api/doctors/?ordering=load', 'MISS')
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get('/api/doctors/cache-stats/').json()
+        self.assertEqual((stats['hits'], stats['misses']), (2, 3))
+
+    def test_doctor_write(self):
+        url = f'/api/doctors/{self.doctors[0].id}/'
+        self.get(url, 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(url, {'name': 'Doctor Renamed'}, format='json')
+        self.assertEqual(self.get(url, 'MISS')['name'], 'Doctor Renamed')
+        self.get('/api/doctors/', 'MISS')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(url)
+        self.assertEqual(len(self.get('/api/doctors/', 'MISS')['results']), 1)
+
+    def test_assignment_write(self):
+        doctor, other = self.doctors
+        self.assertEqual(self.patient_counts(), {doctor.id: 2, other.id: 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/mappings/', {'patient': self.patients[0].id, 'doctor': other.id}, format='json')
+        self.assertEqual(self.patient_counts(), {doctor.id: 2, other.id: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            rows = [{'patient': self.patients[1].id, 'doctor': other.id}]
+            self.client.post('/api/mappings/bulk/', rows, format='json')
+        self.assertEqual(self.patient_counts(), {doctor.id: 2, other.id: 2})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/mappings/remove/', {'patient_id': self.patients[0].id, 'doctor_id': doctor.id},
+                               format='json')
+        self.assertEqual(self.patient_counts(), {doctor.id: 1, other.id: 2})
+
+    def test_uncommitted_write(self):
+        self.get('/api/doctors/', 'MISS')
+        # The version only moves on commit, so nothing can cache pre-commit rows under it
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.patch(f'/api/doctors/{self.doctors[0].id}/', {'name': 'Doctor Renamed'}, format='json')
+            self.get('/api/doctors/', 'HIT')
+        self.assertTrue(callbacks)
+
+
+class ExportTests(APITestCase):
+    """
+    Exports stream the user's rows as NDJSON or CSV, querying only as the
+    body is consumed.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(3)
+        self.seed(2, user=self.other)
+
+    def export(self, url, content_type):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], content_type)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_patients_ndjson(self):
+        body = self.export('/api/patients/export/', 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [patient.id for patient in self.patients])
+        self.assertEqual(set(rows[0]), {'id', 'name', 'age', 'address', 'phone', 'email', 'created_at', 'updated_at'})
+
+    def test_mappings_csv(self):
+        body = self.export('/api/mappings/export/?output=csv', 'text/csv')
+        header, *rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(header[:5], ['id', 'patient', 'patient_name', 'doctor', 'doctor_name'])
+        self.assertEqual(len(rows), 6)
+        self.assertEqual({row[2] for row in rows}, {patient.name for patient in self.patients})
+
+    def test_streamed_lazily(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/patients/export/?output=csv')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="patients.csv"')
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/patients/export/?output=xml')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class FastJSONTests(SimpleTestCase):
+    """
+    The orjson renderer and parser produce and accept exactly what DRF's
+    stdlib JSON classes do.
+    """
+    def test_render_parity(self):
+        now = datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=dt_timezone.utc)
+        data = {
+            'list': [1, 2.5, None, True, 'caf\u00e9 \u2028'],
+            'aware': now, 'naive': now.replace(tzinfo=None), 'whole': now.replace(microsecond=0),
+            'date': now.date(), 'time': now.time(), 'uuid': uuid.UUID(int=5),
+            'decimal': Decimal('1.50'), 'lazy': gettext_lazy('Not found.'), 'delta': timedelta(seconds=3),
+            'error': ErrorDetail('Required', code='required'), 1: 'int key',
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        indented = 'application/json; indent=2'
+        self.assertEqual(FastJSONRenderer().render(data, indented), JSONRenderer().render(data, indented))
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_parse(self):
+        body = '{"a": [1, "caf\u00e9"]}'.encode('utf-8')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), {'a': [1, 'caf\u00e9']})
+        for body in [b'{"a": NaN}', b'{bad']:
+            with self.assertRaises(ParseError):
+                FastJSONParser().parse(io.BytesIO(body))
+
+    def test_without_orjson(self):
+        with mock.patch('api.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render({'a': 1}), b'{"a":1}')
+            self.assertEqual(FastJSONParser().parse(io.BytesIO(b'{"a": 1}')), {'a': 1})
+
+
+class ConditionalTests(APITestCase):
+    """
+    List and detail responses carry an ETag, answer a matching
+    If-None-Match with a bodiless 304 and change their ETag on writes.
+    """
+    def setUp(self):
+        super().setUp()
+        (self.patient, _), (self.doctor, _) = self.seed(2, doctors_per_patient=1)
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304, response.content)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_doctor_list(self):
+        url = '/api/doctors/'
+        etag = self.etag(url)
+        self.assertNotModified(url, etag, 0)
+        self.assertNotEqual(self.etag(url + '?ordering=load'), etag)
+        # patient_count is part of the page
+        with self.captureOnCommitCallbacks(execute=True):
+            PatientDoctorMapping.objects.create(patient=self.patient, doctor=Doctor.objects.last())
+        self.assertModified(url, etag)
+
+    def test_doctor_detail(self):
+        url = f'/api/doctors/{self.doctor.id}/'
+        etag = self.etag(url)
+        self.assertNotModified(url, etag, 1)
+        self.client.patch(url, {'years_of_experience': 9}, format='json')
+        self.assertModified(url, etag)
+
+    def test_bad_ids(self):
+        for pk in ['abc', '99999999999999999999999']:
+            for url in [f'/api/doctors/{pk}/', f'/api/doctors/{pk}/patients/', f'/api/mappings/{pk}/']:
+                self.assertEqual(self.client.get(url).status_code, 404, url)
+
+    def test_patient_list(self):
+        url = '/api/patients/'
+        etag = self.etag(url)
+        self.assertNotModified(url, etag, 1)
+        self.client.delete(f'/api/mappings/{PatientDoctorMapping.objects.first().id}/')
+        self.assertModified(url, etag)
+
+    def test_patient_detail(self):
+        url = f'/api/patients/{self.patient.id}/'
+        response = self.client.get(url)
+        self.assertIn('Last-Modified', response)
+        self.assertNotModified(url, response['ETag'], 1)
+        self.client.patch(url, {'age': 41}, format='json')
+        self.assertModified(url, response['ETag'])
+
+
+def make_cursor(position, reverse=False):
+    data = json.dumps({'p': position, 'r': int(reverse)}).encode('utf-8')
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+class CursorTests(APITestCase):
+    """
+    Keyset cursors: valid ones page through, tampered ones are a 404.
+    """
+    def setUp(self):
+        super().setUp()
+        self.seed(5)
+
+    def test_pages_through(self):
+        seen = []
+        url = '/api/mappings/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            seen.extend(row['id'] for row in response.json()['results'])
+            url = response.json()['next']
+        self.assertEqual(sorted(seen), sorted(PatientDoctorMapping.objects.values_list('id', flat=True)))
+
+    def test_tampered_cursors(self):
+        # /api/mappings/ is ordered by (-assigned_date, -id)
+        cursors = [
+            'not base64 json',
+            make_cursor([None, 1]),
+            make_cursor(['yesterday', 1]),
+            make_cursor(['2024-01-01T00:00:00+00:00', 'one']),
+            make_cursor([{'a': 1}, 1]),
+            make_cursor(['2024-01-01T00:00:00+00:00', [1]]),
+            make_cursor(['2024-01-01T00:00:00+00:00']),
+        ]
+        for cursor in cursors:
+            response = self.client.get('/api/mappings/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404, cursor)
+            self.assertEqual(response.json()['detail'], 'Invalid cursor')
+        for url in ['/api/patients/', '/api/doctors/']:
+            response = self.client.get(url, {'cursor': make_cursor([None, 'x'])})
+            self.assertEqual(response.status_code, 404, url)
+
+
+class SearchTests(APITestCase):
+    def test_ranked_pages(self):
+        self.seed(8)
+        Doctor.objects.filter(license_number='LIC3').update(name='Doctor Smith Smith')
+        Doctor.objects.filter(license_number='LIC5').update(name='Doctor Smithson')
+        seen = []
+        url = '/api/doctors/search/?q=smith&page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            seen.extend(row['name'] for row in response.json()['results'])
+            url = response.json()['next']
+        # Prefix matches, the doctor named twice ranked first
+        self.assertEqual(seen, ['Doctor Smith Smith', 'Doctor Smithson'])
+
+    def test_filters_and_syntax(self):
+        self.seed(3)
+        response = self.client.get('/api/doctors/search/', {'q': 'doctor "1', 'specialty': 'Cardiology'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Doctor 1'])
+
+
+class ParitySerializer(serializers.ModelSerializer):
+    """
+    Column types the list serializers do not use yet: a nullable related
+    key, a decimal and a date.
+    """
+    primary_doctor = serializers.PrimaryKeyRelatedField(read_only=True)
+    fee = serializers.DecimalField(max_digits=8, decimal_places=2, read_only=True)
+    registered_on = serializers.DateField(read_only=True)
+
+    class Meta:
+        model = Patient
+        fields = ('id', 'user', 'name', 'phone', 'created_at', 'primary_doctor', 'fee', 'registered_on')
+
+
+class ValuesParityTests(APITestCase):
+    """
+    The .values() fast path returns exactly what the serializers do.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(3)
+        Patient.objects.filter(pk=self.patients[0].pk).update(phone='555-0199', age=70)
+        PatientDoctorMapping.objects.filter(patient=self.patients[0], doctor=self.doctors[1]).update(
+            is_primary=True, notes='Follow up in spring',
+        )
+
+    def assertParity(self, serializer_class, queryset):
+        representation = ValuesRepresentation(serializer_class)
+        fast = representation.to_representation(representation.values(queryset))
+        slow = serializer_class(queryset, many=True).data
+        self.assertEqual(fast, slow, serializer_class.__name__)
+        self.assertEqual(len(fast), queryset.count())
+
+    def test_list_serializers(self):
+        # Every serializer the list views hand to values_representation
+        self.assertParity(PatientListSerializer, Patient.objects.order_by('-id'))
+        self.assertParity(DoctorListSerializer, Doctor.objects.order_by('name', 'id'))
+        self.assertParity(PatientDoctorMappingSerializer, PatientDoctorMapping.objects.order_by('-assigned_date', '-id'))
+
+    def test_nulls_decimals_and_dates(self):
+        primary = PatientDoctorMapping.objects.filter(patient=OuterRef('pk'), is_primary=True)
+        queryset = Patient.objects.annotate(
+            primary_doctor=Subquery(primary.values('doctor_id')[:1]),
+            fee=Case(
+                When(age__gte=65, then=Value(Decimal('120.5'))),
+                output_field=DecimalField(max_digits=8, decimal_places=2),
+            ),
+            registered_on=TruncDate('created_at'),
+        ).order_by('id')
+        self.assertParity(ParitySerializer, queryset)
+        rows = ParitySerializer(queryset, many=True).data
+        self.assertEqual([row['primary_doctor'] for row in rows], [self.doctors[1].id, None, None])
+        self.assertEqual([row['fee'] for row in rows], ['120.50', None, None])
+
+    def test_endpoints(self):
+        # The async views authenticate the token themselves
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        patient, doctor = self.patients[0].id, self.doctors[0].id
+        urls = [
+            '/api/patients/?page_size=2', '/api/doctors/?page_size=2', '/api/mappings/?page_size=2',
+            f'/api/patients/{patient}/doctors/?page_size=1', f'/api/doctors/{doctor}/patients/?page_size=1',
+            f'/api/mappings/patient/{patient}/', '/api/async/patients/?page_size=2', '/api/async/doctors/',
+            f'/api/async/patients/{patient}/doctors/', f'/api/async/doctors/{doctor}/patients/?page_size=1',
+        ]
+        for url in urls:
+            with self.settings(API_FAST_LIST_SERIALIZERS=True):
+                fast = self.fetch_pages(url)
+            with self.settings(API_FAST_LIST_SERIALIZERS=False):
+                slow = self.fetch_pages(url)
+            self.assertTrue(fast[0]['results'], url)
+            self.assertEqual(fast, slow, url)
+
+    def fetch_pages(self, url):
+        pages = []
+        while url:
+            cache.clear()
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            pages.append(response.json())
+            url = pages[-1]['next']
+        return pages
+
+
+class QueryDetectorTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.seed(12)
+
+    def n_plus_one(self, request=None):
+        names = [patient.user.username for patient in Patient.objects.all()]
+        return HttpResponse(', '.join(names))
+
+    def test_block(self):
+        with self.assertRaisesMessage(QueryProblemsError, '12x the same statement'):
+            with detect_queries('patients'):
+                self.n_plus_one()
+        with detect_queries('patients'):
+            list(Patient.objects.select_related('user'))
+
+    def test_middleware(self):
+        middleware = QueryDetectorMiddleware(self.n_plus_one)
+        with self.assertRaisesMessage(QueryProblemsError, 'in GET /n-plus-one/'):
+            middleware(RequestFactory().get('/n-plus-one/'))
+
+    def test_async_middleware(self):
+        middleware = QueryDetectorMiddleware(sync_to_async(self.n_plus_one))
+        # Django only adapts middleware that is not a coroutine function
+        self.assertTrue(iscoroutinefunction(middleware))
+        with self.assertRaisesMessage(QueryProblemsError, 'in GET /n-plus-one/'):
+            async_to_sync(middleware)(RequestFactory().get('/n-plus-one/'))
+
+    def test_async_request_timing(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = async_to_sync(AsyncClient().get)('/api/async/patients/', headers=headers)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+
+
+class RevocationTests(APITestCase):
+    def login(self):
+        response = self.client.post('/api/auth/login/', {'username': 'alice', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def get(self, access):
+        return self.client.get('/api/patients/', HTTP_AUTHORIZATION=f'Bearer {access}')
+
+    def refresh(self, refresh):
+        return self.client.post('/api/auth/refresh/', {'refresh': refresh}, format='json')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def test_logout_revokes_both_tokens(self):
+        tokens = self.login()
+        other = self.login()
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh': tokens['refresh']}, format='json',
+            HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.get(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        # Other sessions of the same user are untouched
+        self.assertEqual(self.get(other['access']).status_code, 200)
+        self.assertEqual(self.refresh(other['refresh']).status_code, 200)
+
+    def test_logout_rejects_foreign_refresh_token(self):
+        tokens = self.login()
+        bob = self.client.post('/api/auth/login/', {'username': 'bob', 'password': 'pw'}, format='json').json()
+        for refresh in [bob['refresh'], 'garbage', tokens['access']]:
+            response = self.client.post(
+                '/api/auth/logout/', {'refresh': refresh}, format='json',
+                HTTP_AUTHORIZATION=f"Bearer {tokens['access']}",
+            )
+            self.assertEqual(response.status_code, 400, refresh)
+        self.assertEqual(self.refresh(bob['refresh']).status_code, 200)
+
+    def test_rotated_refresh_token_is_revoked(self):
+        tokens = self.login()
+        response = self.refresh(tokens['refresh'])
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def test_deactivated_user(self):
+        tokens = self.login()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(tokens['access']).status_code, 401)
+        self.assertEqual(self.refresh(tokens['refresh']).status_code, 401)
+
+    def test_revocations_are_separate_keys(self):
+        first, second = self.login(), self.login()
+        for tokens in [first, second]:
+            self.client.post('/api/auth/logout/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # Neither revocation overwrote the other
+        deny_list._checked.clear()
+        self.assertEqual(self.get(first['access']).status_code, 401)
+        self.assertEqual(self.get(second['access']).status_code, 401)
+
+    def test_database_user_authentication(self):
+        # The authentication used when JWT_STATELESS_AUTH is off
+        revoked, kept = self.login(), self.login()
+        self.client.post('/api/auth/logout/', HTTP_AUTHORIZATION=f"Bearer {revoked['access']}")
+        factory = RequestFactory()
+        authentication = RevocableJWTAuthentication()
+        request = factory.get('/api/patients/', HTTP_AUTHORIZATION=f"Bearer {revoked['access']}")
+        with self.assertRaises(InvalidToken):
+            authentication.authenticate(request)
+        request = factory.get('/api/patients/', HTTP_AUTHORIZATION=f"Bearer {kept['access']}")
+        self.assertEqual(authentication.authenticate(request)[0], self.user)
+
+
+HAS_REPLICA = 'replica' in settings.DATABASES
+
+
+@skipUnless(HAS_REPLICA, 'needs the replica database of healthcare.test_settings')
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_ROUTERS=['api.routers.ReplicaRouter'])
+class ReplicaRoutingTests(APITestCase):
+    """
+    GET requests read the replica, which here never receives the primary's
+    rows, unless the user has just written. Run with
+    --settings=healthcare.test_settings, which adds that database.
+    """
+    databases = {'default', 'replica'} if HAS_REPLICA else {'default'}
+
+    def create_patient(self, name):
+        response = self.client.post('/api/patients/', {'name': name, 'age': 40, 'address': '1 Main St'}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()['id']
+
+    def names(self, url='/api/patients/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['name'] for row in response.json()['results']]
+
+    def test_reads_use_replica(self):
+        Patient.objects.create(user=self.user, name='Primary only', age=40, address='1 Main St')
+        replica_user = User.objects.using('replica').create(id=self.user.id, username='alice')
+        Patient.objects.using('replica').create(user=replica_user, name='Replica only', age=40, address='1 Main St')
+        self.assertEqual(self.names(), ['Replica only'])
+        # The alias does not outlive the request
+        self.assertIsNone(read_alias.get())
+        self.assertEqual(current_read_alias(), 'default')
+
+    def test_read_your_writes(self):
+        Patient.objects.create(user=self.user, name='Existing', age=40, address='1 Main St')
+        self.create_patient('New')
+        self.assertEqual(sorted(self.names()), ['Existing', 'New'])
+        # Only the writer is pinned to the primary
+        self.client.force_authenticate(self.other)
+        Patient.objects.create(user=self.other, name='Bob', age=40, address='1 Main St')
+        self.assertEqual(self.names(), [])
+
+    def test_use_primary(self):
+        Patient.objects.create(user=self.user, name='Primary only', age=40, address='1 Main St')
+        token = read_alias.set('replica')
+        try:
+            self.assertFalse(Patient.objects.exists())
+            with use_primary():
+                self.assertTrue(Patient.objects.exists())
+            self.assertEqual(current_read_alias(), 'replica')
+        finally:
+            read_alias.reset(token)
+
+    def test_ownership_reads_primary(self):
+        patient = Patient.objects.create(user=self.user, name='Primary only', age=40, address='1 Main St')
+        token = read_alias.set('replica')
+        try:
+            self.assertEqual(filter_owned_patients(self.user.id, [patient.id]), {patient.id})
+            # Users too large for the cached index are checked with a query
+            with self.settings(OWNERSHIP_INDEX_MAX_SIZE=0):
+                cache.clear()
+                self.assertEqual(filter_owned_patients(self.user.id, [patient.id]), {patient.id})
+        finally:
+            read_alias.reset(token)
+
+
+class OwnershipTests(APITestCase):
+    """
+    A user never reaches another user's patients, however the ownership
+    index was filled.
+    """
+    def setUp(self):
+        super().setUp()
+        (self.patient,), (self.doctor,) = self.seed(1)
+        (self.foreign,), _ = self.seed(1, user=self.other)
+
+    def status(self, method, url, data=None):
+        return getattr(self.client, method)(url, data, format='json').status_code
+
+    def test_foreign_patient(self):
+        foreign = self.foreign.id
+        self.assertEqual(self.status('get', f'/api/patients/{foreign}/'), 404)
+        self.assertEqual(self.status('get', f'/api/patients/{foreign}/doctors/'), 404)
+        self.assertEqual(self.status('get', f'/api/mappings/patient/{foreign}/'), 404)
+        self.assertEqual(self.status('post', '/api/mappings/', {'patient': foreign, 'doctor': self.doctor.id}), 400)
+        response = self.client.post(
+            '/api/mappings/bulk/', [{'patient': foreign, 'doctor': self.doctor.id}], format='json',
+        )
+        self.assertEqual(response.json()['results'][0]['status'], 'forbidden')
+        self.assertFalse(PatientDoctorMapping.objects.filter(patient=foreign, doctor=self.doctor).exists())
+
+    def test_reassigned_patient(self):
+        # Both indexes are cached before the patient moves
+        self.assertEqual(self.status('get', f'/api/patients/{self.patient.id}/doctors/'), 200)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.status('get', f'/api/patients/{self.foreign.id}/doctors/'), 200)
+        self.patient.user = self.other
+        self.patient.save()
+        self.assertEqual(self.status('get', f'/api/patients/{self.patient.id}/doctors/'), 200)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.status('get', f'/api/patients/{self.patient.id}/doctors/'), 404)
+
+    def test_stale_index(self):
+        # A move another process made, which never reached this cache
+        self.assertEqual(self.status('get', f'/api/patients/{self.patient.id}/doctors/'), 200)
+        Patient.objects.filter(pk=self.patient.pk).update(user=self.other)
+        patient = self.patient.id
+        self.assertEqual(self.status('get', f'/api/patients/{patient}/'), 404)
+        # The index lets the lists through, the owner filter empties them
+        for url in [f'/api/patients/{patient}/doctors/', f'/api/mappings/patient/{patient}/']:
+            self.assertEqual(self.client.get(url).json()['results'], [])
+        data = {'patient_id': patient, 'doctor_id': self.doctor.id}
+        self.assertEqual(self.status('delete', '/api/mappings/remove/', data), 404)
+        self.assertTrue(PatientDoctorMapping.objects.filter(patient=patient, doctor=self.doctor).exists())
+
+    def test_bulk_import(self):
+        # Both indexes are cached before the import
+        self.assertEqual(self.status('get', f'/api/patients/{self.patient.id}/doctors/'), 200)
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.status('get', f'/api/patients/{self.foreign.id}/doctors/'), 200)
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f:
+            f.write(json.dumps({'name': 'Imported', 'age': 30, 'address': '2 Main St'}) + '\n')
+            f.flush()
+            call_command('import_healthcare', 'patients', f.name, user='alice', stdout=io.StringIO())
+        imported = Patient.objects.get(name='Imported')
+        self.assertEqual(self.status('get', f'/api/patients/{imported.id}/doctors/'), 404)
+        self.assertEqual(self.status('get', f'/api/mappings/patient/{imported.id}/'), 404)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.status('get', f'/api/patients/{imported.id}/doctors/'), 200)
+        self.assertEqual(self.status('get', f'/api/mappings/patient/{imported.id}/'), 200)
+
+
+@override_settings(CHANGE_FEED_SETTLE_SECONDS=0)
+class MappingFeedTests(APITestCase):
+    """
+    Assignment feed rows show the patient's and doctor's names, so renames
+    put the assignments back in the feed.
+    """
+    def setUp(self):
+        super().setUp()
+        # Both patients are assigned to self.doctor only
+        (self.patient, self.other_patient), (self.doctor, self.unchanged) = self.seed(2, doctors_per_patient=1)
+        self.since = self.changes()[1]
+
+    def changes(self, since=None):
+        rows = {}
+        while True:
+            response = self.client.get('/api/mappings/changes/', {'since': since} if since else {})
+            self.assertEqual(response.status_code, 200, response.content)
+            page = response.json()
+            rows.update((row['id'], row) for row in page['results'])
+            since = page['since']
+            if not page['has_more']:
+                return rows, since
+
+    def assertFeed(self, patients, **expected):
+        rows, self.since = self.changes(self.since)
+        self.assertEqual(sorted(row['patient'] for row in rows.values()), sorted(p.id for p in patients))
+        for field, value in expected.items():
+            self.assertEqual({row[field] for row in rows.values()}, {value})
+
+    def test_unrelated_save(self):
+        doctor = Doctor.objects.get(pk=self.doctor.pk)
+        doctor.years_of_experience = 12
+        doctor.save()
+        self.assertEqual(self.changes(self.since)[0], {})
+
+    def test_doctor_rename(self):
+        doctor = Doctor.objects.get(pk=self.doctor.pk)
+        doctor.name = 'Doctor Renamed'
+        doctor.save()
+        self.assertFeed([self.patient, self.other_patient], doctor_name='Doctor Renamed')
+        doctor.specialty = 'Neurology'
+        doctor.save()
+        self.assertFeed([self.patient, self.other_patient], doctor_specialty='Neurology')
+
+    def test_patient_rename(self):
+        patient = Patient.objects.get(pk=self.patient.pk)
+        patient.name = 'Patient Renamed'
+        patient.save()
+        self.assertFeed([self.patient], patient_name='Patient Renamed')
+
+    def test_bulk_upsert(self):
+        doctors = [
+            {'name': doctor.name, 'specialty': doctor.specialty, 'license_number': doctor.license_number,
+             'phone': doctor.phone, 'email': doctor.email, 'years_of_experience': 5}
+            for doctor in [self.doctor, self.unchanged]
+        ]
+        doctors[0]['name'] = 'Doctor Renamed'
+        response = self.client.post('/api/doctors/bulk/', doctors, format='json')
+        self.assertEqual(response.json()['updated'], 2, response.content)
+        self.assertFeed([self.patient, self.other_patient], doctor_name='Doctor Renamed')
+
+    def test_polling_outlives_retention(self):
+        stale = self.since
+        start = timezone.now()
+        for days in range(10, 100, 10):
+            with mock.patch('django.utils.timezone.now', return_value=start + timedelta(days=days)):
+                self.since = self.changes(self.since)[1]
+                response = self.client.get('/api/mappings/changes/', {'since': stale})
+        # Only the cursor nobody polled with has expired
+        self.assertEqual(response.status_code, 410, response.content)
+
+
+class AssignmentRaceTests(APITestCase):
+    """
+    Bulk assignment writes count only the rows they insert, even when
+    another transaction inserts some of the same pairs first.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(3, doctors_per_patient=0)
+
+    def racing(self, pair):
+        """
+        insert_assignments, preceded by a concurrent save of pair.
+        """
+        def insert(mappings):
+            PatientDoctorMapping.objects.create(patient=pair[0], doctor=pair[1])
+            return insert_assignments(mappings)
+        return insert
+
+    def assertCounts(self):
+        stored = {
+            row.specialty: (row.doctors, row.assignments, row.primary_assignments)
+            for row in SpecialtyStats.objects.all()
+        }
+        actual = {
+            row['specialty']: (row['doctors'], row['assignments'], row['primary_assignments'])
+            for row in specialty_totals(Doctor.objects.all())
+        }
+        self.assertEqual(stored, actual)
+        for doctor in Doctor.objects.all():
+            self.assertEqual(doctor.patient_count, doctor.patient_assignments.count())
+
+    def test_bulk_view(self):
+        rows = [{'patient': patient.id, 'doctor': self.doctors[0].id, 'is_primary': True} for patient in self.patients]
+        with mock.patch('api.views.insert_assignments', self.racing((self.patients[1], self.doctors[0]))):
+            response = self.client.post('/api/mappings/bulk/', rows, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [result['status'] for result in response.json()['results']], ['created', 'duplicate', 'created'],
+        )
+        self.assertEqual((response.json()['created'], response.json()['duplicate']), (2, 1))
+        self.assertCounts()
+
+    def test_import(self):
+        rows = [{'patient': patient.id, 'doctor': self.doctors[0].id} for patient in self.patients]
+        command = 'api.management.commands.import_healthcare.insert_assignments'
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as f, \
+                mock.patch(command, self.racing((self.patients[2], self.doctors[0]))):
+            f.write(''.join(json.dumps(row) + '\n' for row in rows))
+            f.flush()
+            out = io.StringIO()
+            call_command('import_healthcare', 'mappings', f.name, stdout=out)
+        self.assertIn('Imported 2 mappings (1 skipped, 0 invalid)', out.getvalue())
+        self.assertCounts()
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], **rates},
+    })
+
+
+class CascadeTests(APITestCase):
+    """
+    Deleting a patient or doctor adjusts the counters, feeds and statistics
+    of all its assignments in a fixed number of queries.
+    """
+    def setUp(self):
+        super().setUp()
+        self.patients, self.doctors = self.seed(3)
+        neurologist = Doctor.objects.get(pk=self.doctors[1].pk)
+        neurologist.specialty = 'Neurology'
+        neurologist.save()
+        PatientDoctorMapping.objects.filter(doctor=neurologist).update(is_primary=True)
+        SpecialtyStats.objects.filter(specialty='Neurology').update(primary_assignments=3)
+        self.doctors = list(Doctor.objects.order_by('id'))
+
+    def assertCounts(self):
+        stored = {
+            row.specialty: (row.doctors, row.assignments, row.primary_assignments)
+            for row in SpecialtyStats.objects.exclude(doctors=0)
+        }
+        actual = {
+            row['specialty']: (row['doctors'], row['assignments'], row['primary_assignments'])
+            for row in specialty_totals(Doctor.objects.all())
+        }
+        self.assertEqual(stored, actual)
+        for doctor in Doctor.objects.all():
+            self.assertEqual(doctor.patient_count, doctor.patient_assignments.count())
+        for patient in Patient.objects.all():
+            self.assertEqual(patient.doctor_count, patient.doctor_assignments.count())
+
+    def buried(self):
+        return set(Tombstone.objects.filter(kind=Tombstone.MAPPING).values_list('user_id', 'object_id'))
+
+    def test_doctor(self):
+        doctor = self.doctors[1]
+        assignments = {(self.user.id, pk) for pk in doctor.patient_assignments.values_list('id', flat=True)}
+        doctor.delete()
+        self.assertCounts()
+        self.assertEqual(self.buried(), assignments)
+
+    def test_patient(self):
+        patient = self.patients[0]
+        assignments = {(self.user.id, pk) for pk in patient.doctor_assignments.values_list('id', flat=True)}
+        patient.delete()
+        self.assertCounts()
+        self.assertEqual(self.buried(), assignments)
+
+    def test_user(self):
+        self.user.delete()
+        self.assertCounts()
+        self.assertEqual(len(self.buried()), 6)
+
+    def test_single_assignment(self):
+        mapping = PatientDoctorMapping.objects.filter(doctor=self.doctors[1]).first()
+        pk = mapping.pk
+        mapping.delete()
+        self.assertCounts()
+        self.assertEqual(self.buried(), {(self.user.id, pk)})
+
+    def test_doctor_queries(self):
+        def delete(doctor):
+            with CaptureQueriesContext(connection) as queries:
+                doctor.delete()
+            return len(queries)
+
+        many, _ = self.seed(20, doctors_per_patient=0)
+        for patient in many:
+            PatientDoctorMapping.objects.create(patient=patient, doctor=self.doctors[1])
+        self.assertEqual(delete(self.doctors[1]), delete(self.doctors[0]))
+        self.assertCounts()
+
+
+class JobTests(APITestCase):
+    """
+    Jobs go from the API through claim_jobs and run_job, and jobs left by a
+    dead worker are requeued or failed exactly once.
+    """
+    def setUp(self):
+        super().setUp()
+        files = tempfile.TemporaryDirectory()
+        self.addCleanup(files.cleanup)
+        self.enterContext(override_settings(JOB_FILES_DIR=Path(files.name)))
+
+    def submit(self, data, format='json'):
+        response = self.client.post('/api/jobs/', data, format=format)
+        self.assertEqual(response.status_code, 202, response.content)
+        self.assertEqual(response.json()['status'], Job.QUEUED)
+        return response.json()['id']
+
+    def run_claimed(self, job_id):
+        self.assertEqual(claim_jobs(5), [job_id])
+        return run_job(job_id)
+
+    def stale(self, job_id):
+        Job.objects.filter(pk=job_id).update(heartbeat_at=timezone.now() - timedelta(days=1))
+
+    def test_export(self):
+        self.seed(3)
+        job_id = self.submit({'kind': 'export', 'model': 'mappings', 'format': 'csv'})
+        self.assertEqual(self.run_claimed(job_id), Job.SUCCEEDED)
+        self.assertEqual(claim_jobs(5), [])
+        job = self.client.get(f'/api/jobs/{job_id}/').json()
+        self.assertEqual((job['progress_done'], job['progress_total'], job['result']['rows']), (6, 6, 6))
+        response = self.client.get(f'/api/jobs/{job_id}/download/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 7)
+        self.assertEqual([job['id'] for job in self.client.get('/api/jobs/').json()['results']], [job_id])
+
+    def test_import(self):
+        rows = '\n'.join(json.dumps({'name': f'Patient {i}', 'age': 30, 'address': '1 Main St'}) for i in range(5))
+        upload = SimpleUploadedFile('patients.ndjson', rows.encode('utf-8'))
+        job_id = self.submit({'kind': 'import', 'model': 'patients', 'file': upload}, format='multipart')
+        self.assertEqual(self.run_claimed(job_id), Job.SUCCEEDED)
+        job = Job.objects.get(pk=job_id)
+        self.assertEqual(job.result, {'written': 5, 'skipped': 0, 'invalid': 0})
+        self.assertEqual(Patient.objects.filter(user=self.user).count(), 5)
+        # The upload is removed once imported
+        self.assertFalse(list(settings.JOB_FILES_DIR.iterdir()))
+
+    def test_failure(self):
+        job = Job.objects.create(user=self.user, kind='export', params={'model': 'doctors', 'format': 'csv'})
+        with self.assertLogs('api.jobs', 'ERROR'):
+            self.assertEqual(self.run_claimed(job.id), Job.FAILED)
+        self.assertIn('KeyError', Job.objects.get(pk=job.id).error)
+        self.assertEqual(self.client.get(f'/api/jobs/{job.id}/download/').status_code, 404)
+
+    def test_permissions(self):
+        for kind, expected in [('unknown', 400), ('recount_assignments', 403)]:
+            self.assertEqual(self.client.post('/api/jobs/', {'kind': kind}, format='json').status_code, expected)
+        theirs = Job.objects.create(user=self.other, kind='export', status=Job.SUCCEEDED, params={})
+        self.assertEqual(self.client.get(f'/api/jobs/{theirs.id}/').status_code, 404)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.run_claimed(self.submit({'kind': 'rebuild_doctor_stats'})), Job.SUCCEEDED)
+
+    def test_requeue_stale(self):
+        export = Job.objects.create(user=self.user, kind='export', params={})
+        imported = Job.objects.create(user=self.user, kind='import', params={})
+        claim_jobs(5)
+        self.stale(export.id)
+        self.stale(imported.id)
+        # A half-done import is not safe to run again
+        self.assertEqual(requeue_stale_jobs(), (1, 1))
+        self.assertEqual(Job.objects.get(pk=export.id).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=imported.id).status, Job.FAILED)
+        for attempt in range(2, settings.JOB_MAX_ATTEMPTS + 1):
+            self.assertEqual(claim_jobs(5), [export.id])
+            self.stale(export.id)
+            expected = (1, 0) if attempt < settings.JOB_MAX_ATTEMPTS else (0, 1)
+            self.assertEqual(requeue_stale_jobs(), expected)
+
+    def test_release_claimed_job(self):
+        job = Job.objects.create(user=self.user, kind='export', params={})
+        claim_jobs(5)
+        claimed = []
+        requeue = QuerySet.update
+
+        def claim_after_requeue(queryset, **fields):
+            # Another worker claims the job as soon as it is queued again
+            count = requeue(queryset, **fields)
+            if fields.get('status') == Job.QUEUED:
+                claimed.extend(claim_jobs(5))
+            return count
+
+        with mock.patch.object(QuerySet, 'update', claim_after_requeue):
+            self.assertEqual(release_jobs(Job.objects.filter(pk=job.id), 'Worker process died'), (1, 0))
+        self.assertEqual(claimed, [job.id])
+        job = Job.objects.get(pk=job.id)
+        self.assertEqual((job.status, job.attempts, job.error), (Job.RUNNING, 2, ''))
+
+
+class ThrottleTests(APITestCase):
+    def login(self, address):
+        return self.client.post(
+            '/api/auth/login/', {'username': 'alice', 'password': 'wrong'}, format='json',
+            HTTP_X_FORWARDED_FOR=address, REMOTE_ADDR='10.0.0.1',
+        ).status_code
+
+    @throttle_rates(auth='3/min')
+    def test_clients_behind_proxy(self):
+        self.client = APIClient()
+        self.assertEqual([self.login('203.0.113.7') for _ in range(4)], [401, 401, 401, 429])
+        # Another client behind the same proxy has a bucket of its own
+        self.assertEqual(self.login('203.0.113.8'), 401)
+
+    @throttle_rates(user='2/min')
+    @override_settings(THROTTLE_STORE='cache')
+    def test_async_views(self):
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        statuses = [self.client.get('/api/async/doctors/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
@@ -0,0 +1,171 @@
+"""
+Token-bucket rate limits for the API.
+
+Each throttle scope has a rate such as '10/min' in REST_FRAMEWORK's
+DEFAULT_THROTTLE_RATES: a bucket holds that many requests and refills
+evenly over the period, so clients can burst up to the full budget and
+then continue at the average rate. Buckets live in the store selected by
+THROTTLE_STORE: 'local' (this process's memory, no I/O, each worker
+enforcing the limit on its own), 'cache' (the shared Django cache) or the
+dotted path of a class with the same consume() method.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+from rest_framework import permissions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+           'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """
+    '10/min' -> (10, 60); None or '' -> None (no limit).
+    """
+    if not rate:
+        return None
+    try:
+        count, period = rate.split('/')
+        return int(count), PERIODS[period.strip().lower()]
+    except (ValueError, KeyError):
+        raise ImproperlyConfigured(f'Invalid throttle rate {rate!r}, expected e.g. "10/min"')
+
+
+def refill(tokens, elapsed, capacity, period):
+    """
+    Take one token from a bucket holding tokens after it refilled for
+    elapsed seconds. Returns the tokens left and the seconds to wait for a
+    token when the bucket is empty (0 when the request may go ahead).
+    """
+    tokens = min(capacity, tokens + elapsed * capacity / period)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) * period / capacity
+
+
+class LocalBucketStore:
+    """
+    Buckets in this process's memory, the least recently used dropped
+    beyond maxsize (which only lets those clients start over with a full
+    bucket).
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key, capacity, period):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, wait = refill(tokens, now - updated, capacity, period)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class CacheBucketStore:
+    """
+    Buckets in the shared cache, so the limits hold across workers and
+    hosts. Like DRF's own throttles this reads and writes without a lock:
+    requests racing on one bucket can each take the same token.
+    """
+    def consume(self, key, capacity, period):
+        now = time.time()
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens, wait = refill(tokens, max(now - updated, 0), capacity, period)
+        # An untouched bucket is full again after one period
+        cache.set(key, (tokens, now), timeout=period)
+        return wait
+
+
+STORES = {
+    'local': LocalBucketStore,
+    'cache': CacheBucketStore,
+}
+
+
+@lru_cache(maxsize=None)
+def get_store(name):
+    return (STORES.get(name) or import_string(name))()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base class: subclasses name the scope and the identity a bucket
+    belongs to, either of which may be None to let the request through.
+    """
+    scope = None
+    wait_seconds = None
+
+    def get_scope(self, request):
+        return self.scope
+
+    def get_key(self, request, view):
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        scope = self.get_scope(request)
+        rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(scope)) if scope else None
+        if rate is None:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        self.wait_seconds = get_store(settings.THROTTLE_STORE).consume(f'throttle:{scope}:{key}', *rate)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+    def user_or_ip(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+
+class UserThrottle(TokenBucketThrottle):
+    """
+    Every request: the 'user' budget per authenticated user, the 'anon'
+    budget per client IP otherwise.
+    """
+    def get_scope(self, request):
+        user = getattr(request, 'user', None)
+        return 'user' if user is not None and user.is_authenticated else 'anon'
+
+    def get_key(self, request, view):
+        return self.user_or_ip(request)
+
+
+class WriteThrottle(TokenBucketThrottle):
+    """
+    Requests that change data, per user (or IP), on the 'write' budget.
+    """
+    scope = 'write'
+
+    def get_key(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return None
+        return self.user_or_ip(request)
+
+
+class AuthThrottle(TokenBucketThrottle):
+    """
+    Login, token refresh and registration, per client IP, on the 'auth'
+    budget: each login attempt runs the password hasher.
+    """
+    scope = 'auth'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
@@ -1,13 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PatientViewSet, DoctorViewSet, PatientDoctorMappingViewSet
+from . import async_views
+from .views import PatientViewSet, DoctorViewSet, PatientDoctorMappingViewSet, JobViewSet
 
 # Create router and register viewsets
 router = DefaultRouter()
 router.register(r'patients', PatientViewSet, basename='patients')
 router.register(r'doctors', DoctorViewSet, basename='doctors')
 router.register(r'mappings', PatientDoctorMappingViewSet, basename='mappings')
+router.register(r'jobs', JobViewSet, basename='jobs')
+
+# Async read-only variants of the hot GET endpoints (serve with an ASGI server)
+async_urlpatterns = [
+    path('patients/', async_views.patient_list, name='async-patients-list'),
+    path('patients/<int:pk>/', async_views.patient_detail, name='async-patients-detail'),
+    path('patients/<int:pk>/doctors/', async_views.patient_doctors, name='async-patients-doctors'),
+    path('doctors/', async_views.doctor_list, name='async-doctors-list'),
+    path('doctors/<int:pk>/', async_views.doctor_detail, name='async-doctors-detail'),
+    path('doctors/<int:pk>/patients/', async_views.doctor_patients, name='async-doctors-patients'),
+]
 
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
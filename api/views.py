@@ -1,17 +1,163 @@
-from rest_framework import generics, viewsets, permissions, status
+from rest_framework import generics, mixins, viewsets, permissions, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from .models import Patient, Doctor, PatientDoctorMapping
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max
+from django.http import FileResponse, Http404
+from .authentication import revoke_token
+from .cache import (
+    bump_doctor_version,
+    doctor_cache_key,
+    doctor_cache_stats,
+    filter_owned_patients,
+    get_cached_doctor_response,
+    get_doctor_version,
+    owns_patient,
+    set_cached_doctor_response
+)
+from .changes import change_feed_response
+from .conditional import conditional_headers, make_etag, not_modified_response
+from .exports import EXPORT_FORMATS, export_response, mapping_export, patient_export
+from .jobs import JOB_KINDS, job_path, save_upload
+from .models import (
+    Patient,
+    Doctor,
+    Job,
+    PatientDoctorMapping,
+    STAT_FIELDS,
+    SpecialtyStats,
+    Tombstone,
+    adjust_specialty_stats,
+    insert_assignments,
+    recount_assignments,
+    specialty_totals,
+    touch_assignments
+)
+from .routers import choose_replica, current_read_alias, is_pinned, pin_to_primary, read_alias, use_primary
+from .search import search_doctors
 from .serializers import (
     UserRegistrationSerializer,
     PatientSerializer,
     PatientListSerializer,
     DoctorSerializer,
     DoctorListSerializer,
-    PatientDoctorMappingSerializer
+    DoctorBulkSerializer,
+    DoctorSearchSerializer,
+    SpecialtyStatsSerializer,
+    PatientDoctorMappingSerializer,
+    PatientDoctorMappingBulkSerializer,
+    JobSerializer,
+    values_representation
 )
+from .renderers import FastJSONParser
+from .throttling import AuthThrottle
+
+# Rows written per INSERT statement by the bulk endpoints
+BULK_BATCH_SIZE = 1000
+
+# Doctors listed by patient count in /api/doctors/stats/
+STATS_BUSIEST_DOCTORS = 10
+
+
+def check_bulk_rows(rows, noun):
+    """
+    Return an error response when a bulk payload is not a list of
+    acceptable size, otherwise None.
+    """
+    if not isinstance(rows, list) or not rows:
+        return Response({
+            'error': f'Expected a non-empty list of {noun}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.API_MAX_BULK_SIZE:
+        return Response({
+            'error': f'At most {settings.API_MAX_BULK_SIZE} {noun} can be sent at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return None
+
+
+def get_export_format(request):
+    """
+    Return the requested export format, or None when it is not supported.
+    """
+    output = request.query_params.get('output', 'ndjson')
+    return output if output in EXPORT_FORMATS else None
+
+
+def export_format_error():
+    return Response({
+        'error': f'output must be one of: {", ".join(EXPORT_FORMATS)}'
+    }, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ReplicaReadMixin:
+    """
+    Serve GET requests from a read replica, unless the user wrote within
+    the last REPLICA_PIN_SECONDS, and pin the user to the primary after
+    every successful write so they always read their own writes.
+    """
+    read_alias_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in permissions.SAFE_METHODS
+            and not is_pinned(request.user.id)
+        ):
+            self.read_alias_token = read_alias.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.read_alias_token is not None:
+            read_alias.reset(self.read_alias_token)
+            self.read_alias_token = None
+        elif (
+            settings.DATABASE_REPLICAS
+            and request.method not in permissions.SAFE_METHODS
+            and response.status_code < 400
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user.id)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ValuesListMixin:
+    """
+    Build read-only list responses from .values() rows through the list
+    serializer's fast path, unless API_FAST_LIST_SERIALIZERS is off.
+    """
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.list_response(queryset, self.get_serializer_class())
+
+    def list_response(self, queryset, serializer_class):
+        if not settings.API_FAST_LIST_SERIALIZERS:
+            page = self.paginate_queryset(queryset)
+            serializer = serializer_class(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        representation = values_representation(serializer_class)
+        page = self.paginate_queryset(representation.values(queryset))
+        return self.get_paginated_response(representation.to_representation(page))
+
+
+class IdLookupMixin:
+    """
+    Answer ids too large for the database with a 404, as DRF already does
+    for ids that are not numbers at all.
+    """
+    def get_object(self):
+        try:
+            return super().get_object()
+        except OverflowError:
+            # SQLite refuses ids beyond 64 bits instead of matching nothing
+            raise Http404
 
 
 class RegisterView(generics.CreateAPIView):
@@ -21,6 +167,7 @@ class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserRegistrationSerializer
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [AuthThrottle]
 
     def create(self, request, *args, **kwargs):
         try:
@@ -35,7 +182,32 @@ class RegisterView(generics.CreateAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PatientViewSet(viewsets.ModelViewSet):
+class LogoutView(APIView):
+    """
+    Revoke the access token used for this request and the refresh token
+    sent in the body, if any.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        refresh = request.data.get('refresh')
+        if refresh is not None:
+            try:
+                refresh = RefreshToken(refresh)
+            except TokenError:
+                refresh = None
+            if refresh is None or str(refresh.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.id):
+                return Response({
+                    'error': 'Invalid refresh token'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            revoke_token(refresh)
+        revoke_token(request.auth)
+        return Response({
+            'message': 'Logged out successfully'
+        }, status=status.HTTP_200_OK)
+
+
+class PatientViewSet(ReplicaReadMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing patients.
     Only authenticated users can access and manage their own patients.
@@ -44,15 +216,48 @@ class PatientViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Patient.objects.filter(user=self.request.user)
+        return Patient.objects.filter(user_id=self.request.user.id)
 
     def get_serializer_class(self):
         if self.action == 'list':
             return PatientListSerializer
         return PatientSerializer
 
+    def list(self, request, *args, **kwargs):
+        # One aggregate decides whether anything in the list changed,
+        # including the assignments behind doctor_count
+        state = Patient.objects.filter(user_id=request.user.id).aggregate(
+            last_modified=Max('updated_at'),
+            count=Count('id', distinct=True),
+            assignments=Count('doctor_assignments'),
+            last_assigned=Max('doctor_assignments__assigned_date'),
+        )
+        etag = make_etag('patients', request.user.id, *state.values())
+        response = not_modified_response(request, etag)
+        if response is not None:
+            return response
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = make_etag('patient', instance.pk, instance.updated_at.isoformat())
+        response = not_modified_response(request, etag, instance.updated_at)
+        if response is not None:
+            return response
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data, headers=conditional_headers(etag, instance.updated_at))
+
+    def get_object(self):
+        # Other users' patients are turned away by the ownership index
+        # before any query runs; the queryset still checks the owner
+        if not owns_patient(self.request.user.id, self.kwargs[self.lookup_url_kwarg or self.lookup_field]):
+            raise Http404
+        return super().get_object()
+
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        serializer.save(user_id=self.request.user.id)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -68,13 +273,36 @@ class PatientViewSet(viewsets.ModelViewSet):
         """
         Get all doctors assigned to a specific patient.
         """
-        patient = self.get_object()
-        mappings = PatientDoctorMapping.objects.filter(patient=patient)
-        serializer = PatientDoctorMappingSerializer(mappings, many=True)
-        return Response(serializer.data)
+        if not owns_patient(request.user.id, pk):
+            raise Http404
+        mappings = PatientDoctorMapping.objects.with_related().filter(patient_id=pk, patient__user_id=request.user.id)
+        return self.list_response(mappings, PatientDoctorMappingSerializer)
 
 
-class DoctorViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all of the user's patients as NDJSON or CSV (?output=ndjson|csv).
+        """
+        output = get_export_format(request)
+        if output is None:
+            return export_format_error()
+        queryset, fields = patient_export(request.user.id)
+        # The rows are streamed after the view returns, so bind the alias now
+        return export_response(queryset.using(current_read_alias()), fields, output, 'patients')
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Patients changed or removed since the ?since= cursor of the previous page.
+        """
+        queryset = Patient.objects.filter(user_id=request.user.id).select_related('user')
+        return change_feed_response(
+            request, queryset, Tombstone.PATIENT, PatientSerializer, self.paginator.get_page_size(request)
+        )
+
+
+class DoctorViewSet(ReplicaReadMixin, IdLookupMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing doctors.
     All authenticated users can view and manage doctors.
@@ -83,11 +311,62 @@ class DoctorViewSet(viewsets.ModelViewSet):
     serializer_class = DoctorSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = Doctor.objects.all()
+        if self.action == 'list' and self.request.query_params.get('ordering') == 'load':
+            # Busiest doctors first, served from doctor_load_idx
+            queryset = queryset.order_by('-patient_count')
+        return queryset
+
     def get_serializer_class(self):
         if self.action == 'list':
             return DoctorListSerializer
         return DoctorSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Every doctor and assignment write bumps the table version, so the
+        # version and the query params decide the page without a query
+        etag = make_etag('doctors', get_doctor_version(), request.get_full_path())
+        response = not_modified_response(request, etag)
+        if response is None:
+            response = self.cached_response(super().list, request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            updated_at = Doctor.objects.filter(pk=kwargs['pk']).values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError, OverflowError):
+            raise Http404
+        if updated_at is None:
+            return self.cached_response(super().retrieve, request, *args, **kwargs)
+        # No Last-Modified: patient_count can change without touching updated_at
+        etag = make_etag('doctor', kwargs['pk'], get_doctor_version(), updated_at.isoformat())
+        response = not_modified_response(request, etag)
+        if response is None:
+            response = self.cached_response(super().retrieve, request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        """
+        Serve list/detail responses from the cache, keyed on the URL and
+        the doctor table version that the model signals bump.
+        """
+        key = doctor_cache_key(request, self.action)
+        data = get_cached_doctor_response(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        # Entries are shared by every user, so build them from the primary:
+        # a lagging replica could otherwise cache stale rows under the
+        # version that was just bumped
+        with use_primary():
+            response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_cached_doctor_response(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
     def create(self, request, *args, **kwargs):
         try:
             return super().create(request, *args, **kwargs)
@@ -96,18 +375,151 @@ class DoctorViewSet(viewsets.ModelViewSet):
                 'error': 'Doctor with this license number already exists'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk_upsert(self, request):
+        """
+        Insert or update doctors in bulk, keyed by license_number.
+        Rows whose fields all match the stored doctor are left untouched.
+        """
+        rows = request.data
+        error = check_bulk_rows(rows, 'doctors')
+        if error:
+            return error
+
+        row_serializer = DoctorBulkSerializer()
+        fields = list(DoctorBulkSerializer.Meta.fields)
+        errors, by_license = [], {}
+        for index, row in enumerate(rows):
+            try:
+                data = row_serializer.run_validation(row)
+            except ValidationError as e:
+                errors.append({'index': index, 'errors': e.detail})
+                continue
+            if data['license_number'] in by_license:
+                errors.append({'index': index, 'errors': {
+                    'license_number': ['Duplicate license_number in this request']
+                }})
+                continue
+            by_license[data['license_number']] = data
+
+        licenses = list(by_license)
+        inserted = updated = unchanged = 0
+        for start in range(0, len(licenses), BULK_BATCH_SIZE):
+            batch = licenses[start:start + BULK_BATCH_SIZE]
+            current = {
+                row['license_number']: row
+                for row in Doctor.objects.filter(license_number__in=batch).values(*fields)
+            }
+            to_write, restated, renamed = [], [], []
+            for license_number in batch:
+                data = by_license[license_number]
+                stored = current.get(license_number)
+                if stored is None:
+                    inserted += 1
+                    restated.append(license_number)
+                elif any(stored[field] != data[field] for field in fields):
+                    updated += 1
+                    if stored['specialty'] != data['specialty']:
+                        restated.append(license_number)
+                    # Assignment feed rows show both
+                    if any(stored[field] != data[field] for field in ('name', 'specialty')):
+                        renamed.append(license_number)
+                else:
+                    unchanged += 1
+                    continue
+                to_write.append(Doctor(**data))
+
+            with transaction.atomic():
+                # bulk_create sends no post_save signals
+                bump_doctor_version()
+                # New doctors and doctors changing specialty move in the
+                # statistics along with their assignments
+                restated_doctors = Doctor.objects.filter(license_number__in=restated)
+                if restated:
+                    adjust_specialty_stats(specialty_totals(restated_doctors), -1)
+                Doctor.objects.bulk_create(
+                    to_write,
+                    update_conflicts=True,
+                    unique_fields=['license_number'],
+                    update_fields=[f for f in fields if f != 'license_number'] + ['updated_at'],
+                )
+                if restated:
+                    adjust_specialty_stats(specialty_totals(restated_doctors))
+                if renamed:
+                    touch_assignments(PatientDoctorMapping.objects.filter(doctor__license_number__in=renamed))
+
+        return Response({
+            'inserted': inserted,
+            'updated': updated,
+            'unchanged': unchanged,
+            'invalid': len(errors),
+            'errors': errors,
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search doctors by name, specialty or license number.
+        Supports ?q=, ?specialty= and ?min_experience=; results matching q
+        are ordered by relevance, otherwise by name.
+        """
+        queryset = Doctor.objects.all()
+        specialty = request.query_params.get('specialty')
+        if specialty:
+            queryset = queryset.filter(specialty=specialty)
+        min_experience = request.query_params.get('min_experience')
+        if min_experience:
+            try:
+                queryset = queryset.filter(years_of_experience__gte=int(min_experience))
+            except ValueError:
+                return Response({
+                    'error': 'min_experience must be an integer'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        q = request.query_params.get('q', '').strip()
+        if q:
+            queryset = search_doctors(queryset, q).order_by('-rank')
+
+        page = self.paginate_queryset(queryset)
+        serializer = DoctorSearchSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Doctor workload overall and per specialty, plus the busiest doctors.
+        Reads the SpecialtyStats summary table and doctor_load_idx, so the
+        cost does not grow with the number of assignments.
+        """
+        specialties = list(SpecialtyStats.objects.filter(doctors__gt=0).order_by('-assignments', 'specialty'))
+        totals = SpecialtyStats(**{field: sum(getattr(row, field) for row in specialties) for field in STAT_FIELDS})
+        overall = SpecialtyStatsSerializer(totals).data
+        overall.pop('specialty')
+        busiest = Doctor.objects.order_by('-patient_count', '-id')[:STATS_BUSIEST_DOCTORS]
+        return Response({
+            'totals': overall,
+            'specialties': SpecialtyStatsSerializer(specialties, many=True).data,
+            'busiest_doctors': DoctorListSerializer(busiest, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'], url_path='cache-stats',
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        """
+        Hit and miss counters of the doctor response cache.
+        """
+        return Response(doctor_cache_stats())
+
     @action(detail=True, methods=['get'])
     def patients(self, request, pk=None):
         """
         Get all patients assigned to a specific doctor.
         """
         doctor = self.get_object()
-        mappings = PatientDoctorMapping.objects.filter(doctor=doctor)
-        serializer = PatientDoctorMappingSerializer(mappings, many=True)
-        return Response(serializer.data)
+        mappings = PatientDoctorMapping.objects.with_related().filter(doctor=doctor)
+        return self.list_response(mappings, PatientDoctorMappingSerializer)
 
 
-class PatientDoctorMappingViewSet(viewsets.ModelViewSet):
+class PatientDoctorMappingViewSet(ReplicaReadMixin, IdLookupMixin, ValuesListMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing patient-doctor assignments.
     """
@@ -117,7 +529,7 @@ class PatientDoctorMappingViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Only show mappings for patients owned by the current user
-        return PatientDoctorMapping.objects.filter(patient__user=self.request.user)
+        return PatientDoctorMapping.objects.with_related().filter(patient__user_id=self.request.user.id)
 
     def create(self, request, *args, **kwargs):
         try:
@@ -127,20 +539,107 @@ class PatientDoctorMappingViewSet(viewsets.ModelViewSet):
                 'error': 'This patient is already assigned to this doctor'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Assign doctors to patients in bulk.
+        Expects a list of {patient, doctor, is_primary, notes} objects and
+        returns the outcome of every row: created, duplicate, forbidden or invalid.
+        """
+        rows = request.data
+        error = check_bulk_rows(rows, 'assignments')
+        if error:
+            return error
+
+        # One serializer validates the shape of every row
+        row_serializer = PatientDoctorMappingBulkSerializer()
+        results, valid = [], []
+        for index, row in enumerate(rows):
+            try:
+                data = row_serializer.run_validation(row)
+            except ValidationError as e:
+                results.append({'index': index, 'status': 'invalid', 'errors': e.detail})
+                continue
+            result = {'index': index, 'patient': data['patient'], 'doctor': data['doctor']}
+            results.append(result)
+            valid.append((result, data))
+
+        patient_ids = {data['patient'] for _, data in valid}
+        doctor_ids = {data['doctor'] for _, data in valid}
+        owned = filter_owned_patients(request.user.id, patient_ids)
+        doctors = set(Doctor.objects.filter(id__in=doctor_ids).values_list('id', flat=True))
+        existing = set(
+            PatientDoctorMapping.objects.filter(patient_id__in=owned, doctor_id__in=doctors)
+            .values_list('patient_id', 'doctor_id')
+        )
+
+        to_create = []
+        for result, data in valid:
+            pair = (data['patient'], data['doctor'])
+            if data['patient'] not in owned:
+                result['status'] = 'forbidden'
+            elif data['doctor'] not in doctors:
+                result['status'] = 'invalid'
+                result['errors'] = {'doctor': ['Doctor not found']}
+            elif pair in existing:
+                result['status'] = 'duplicate'
+            else:
+                existing.add(pair)
+                to_create.append((result, PatientDoctorMapping(
+                    patient_id=data['patient'],
+                    doctor_id=data['doctor'],
+                    is_primary=data['is_primary'],
+                    notes=data['notes'],
+                )))
+
+        with transaction.atomic():
+            # Patient counts change; the insert sends no post_save signals
+            bump_doctor_version()
+            # Pairs inserted concurrently since the lookup above are skipped
+            created = insert_assignments([mapping for _, mapping in to_create])
+            recount_assignments(created)
+        for result, mapping in to_create:
+            result['status'] = 'created' if mapping.pk else 'duplicate'
+
+        summary = {key: 0 for key in ('created', 'duplicate', 'forbidden', 'invalid')}
+        for result in results:
+            summary[result['status']] += 1
+        return Response({**summary, 'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all of the user's assignments as NDJSON or CSV (?output=ndjson|csv).
+        """
+        output = get_export_format(request)
+        if output is None:
+            return export_format_error()
+        queryset, fields = mapping_export(request.user.id)
+        return export_response(queryset.using(current_read_alias()), fields, output, 'assignments')
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Assignments changed or removed since the ?since= cursor of the previous page.
+        """
+        return change_feed_response(
+            request, self.get_queryset(), Tombstone.MAPPING, PatientDoctorMappingSerializer,
+            self.paginator.get_page_size(request)
+        )
+
     @action(detail=False, methods=['get'], url_path='patient/(?P<patient_id>[^/.]+)')
     def by_patient(self, request, patient_id=None):
         """
         Get all doctor mappings for a specific patient.
         """
-        try:
-            patient = Patient.objects.get(id=patient_id, user=request.user)
-            mappings = PatientDoctorMapping.objects.filter(patient=patient)
-            serializer = self.get_serializer(mappings, many=True)
-            return Response(serializer.data)
-        except Patient.DoesNotExist:
+        if not owns_patient(request.user.id, patient_id):
             return Response({
                 'error': 'Patient not found or you do not have permission to view this patient'
             }, status=status.HTTP_404_NOT_FOUND)
+        mappings = PatientDoctorMapping.objects.with_related().filter(
+            patient_id=patient_id, patient__user_id=request.user.id
+        )
+        return self.list_response(mappings, PatientDoctorMappingSerializer)
 
     @action(detail=False, methods=['delete'], url_path='remove')
     def remove_assignment(self, request):
@@ -150,17 +649,17 @@ class PatientDoctorMappingViewSet(viewsets.ModelViewSet):
         """
         patient_id = request.data.get('patient_id')
         doctor_id = request.data.get('doctor_id')
-        
+
         if not patient_id or not doctor_id:
             return Response({
                 'error': 'Both patient_id and doctor_id are required'
             }, status=status.HTTP_400_BAD_REQUEST)
 
         try:
+            if not owns_patient(request.user.id, patient_id):
+                raise PatientDoctorMapping.DoesNotExist
             mapping = PatientDoctorMapping.objects.get(
-                patient_id=patient_id,
-                doctor_id=doctor_id,
-                patient__user=request.user
+                patient_id=patient_id, doctor_id=doctor_id, patient__user_id=request.user.id
             )
             mapping.delete()
             return Response({
@@ -169,4 +668,59 @@ class PatientDoctorMappingViewSet(viewsets.ModelViewSet):
         except PatientDoctorMapping.DoesNotExist:
             return Response({
                 'error': 'Assignment not found'
-            }, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            }, status=status.HTTP_404_NOT_FOUND)
+
+
+class JobViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, mixins.RetrieveModelMixin,
+                 viewsets.GenericViewSet):
+    """
+    Submit background jobs and poll their status and progress. Reads go
+    to the primary, so progress never appears to move backwards.
+    """
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [FastJSONParser, MultiPartParser]
+
+    def get_queryset(self):
+        return Job.objects.filter(user_id=self.request.user.id)
+
+    def create(self, request, *args, **kwargs):
+        """
+        Queue a job: {"kind": ..., plus the parameters of that kind}.
+        Imports are sent as multipart/form-data with the file in "file".
+        """
+        kind = request.data.get('kind')
+        spec = JOB_KINDS.get(kind)
+        if spec is None:
+            return Response({
+                'error': f'kind must be one of: {", ".join(JOB_KINDS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if spec.staff_only and not request.user.is_staff:
+            return Response({
+                'error': f'Only staff can run {kind} jobs'
+            }, status=status.HTTP_403_FORBIDDEN)
+        params = {}
+        if spec.params_serializer is not None:
+            serializer = spec.params_serializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            params = dict(serializer.validated_data)
+            if 'file' in params:
+                params['file'] = save_upload(params['file'])
+        job = Job.objects.create(user_id=request.user.id, kind=kind, params=params)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Download the file written by a finished export job.
+        """
+        job = self.get_object()
+        name = (job.result or {}).get('file') if job.status == Job.SUCCEEDED else None
+        if name is None or not job_path(name).exists():
+            return Response({
+                'error': 'This job has no file to download'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            open(job_path(name), 'rb'), as_attachment=True, filename=name,
+            content_type=EXPORT_FORMATS.get(job.params.get('format')),
+        )
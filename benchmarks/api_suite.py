@@ -0,0 +1,379 @@
+"""
+Latency, query count and response size for every API endpoint.
+
+By default the suite creates a throwaway test database on the configured
+backend (SQLite, or Postgres when DATABASE_URL points at one), seeds it
+with benchmarks.data and sends the requests in-process through Django's
+full request handler, which also lets it count the SQL queries each
+request runs:
+
+    python -m benchmarks.api_suite --output before.json
+    python -m benchmarks.api_suite --output after.json --compare before.json
+
+With --base-url it measures a server that is already running instead, for
+example one started with gunicorn against a database seeded beforehand.
+Query counts are then not available:
+
+    python -m benchmarks.api_suite --base-url http://127.0.0.1:8000 \\
+        --username alice --password secret --output live.json
+
+Scenarios can be selected by name prefix, e.g. --only patients. Write
+scenarios create their own rows in untimed setup requests.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, override_settings  # noqa: E402
+
+from benchmarks.data import BENCH_PASSWORD, BENCH_USERNAME, seed  # noqa: E402
+from benchmarks.report import compare_reports, environment, latency_summary, write_report  # noqa: E402
+
+Result = namedtuple('Result', ['status', 'body', 'ms', 'queries'])
+
+# Unique suffixes for rows created by the write scenarios
+serial = itertools.count()
+
+
+class InProcessClient:
+    """
+    Sends requests through Django's test client, so every middleware, the
+    URL resolver and the view run exactly as under a WSGI server.
+    """
+    def __init__(self):
+        self.client = Client(raise_request_exception=False, SERVER_NAME='localhost')
+
+    def request(self, method, path, body=None, token=None):
+        extra = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        data = json.dumps(body) if body is not None else ''
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = self.client.generic(method, path, data, content_type='application/json', **extra)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+            ms = (time.perf_counter() - started) * 1000
+        return Result(response.status_code, content, ms, len(queries))
+
+
+class HTTPClient:
+    """
+    Sends requests over one keep-alive connection to a running server.
+    """
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc)
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        started = time.perf_counter()
+        self.connection.request(method, path, body=data, headers=headers)
+        response = self.connection.getresponse()
+        content = response.read()
+        ms = (time.perf_counter() - started) * 1000
+        return Result(response.status, content, ms, None)
+
+
+def call(api, method, path, body=None, token=None):
+    """
+    Untimed setup request; returns the decoded JSON body.
+    """
+    result = api.request(method, path, body, token)
+    if result.status >= 400:
+        raise RuntimeError(f'{method} {path} failed during setup: {result.status} {result.body[:200]!r}')
+    return json.loads(result.body) if result.body else None
+
+
+def login(api, username, password):
+    return call(api, 'POST', '/api/auth/login/', {'username': username, 'password': password})
+
+
+def new_patient(api, ctx):
+    n = next(serial)
+    return call(api, 'POST', '/api/patients/', {
+        'name': f'Bench Patient {n}', 'age': 40, 'address': '2 Benchmark Street',
+    }, ctx['token'])
+
+
+def new_doctor(n):
+    return {
+        'name': f'Bench Doctor {n}',
+        'specialty': 'Cardiology',
+        'license_number': f'BENCH{os.getpid()}-{n}',
+        'phone': '555-0199',
+        'email': f'bench-doctor{n}@example.com',
+        'years_of_experience': 10,
+    }
+
+
+def discover(api, username, password):
+    """
+    Log in and find the ids the read scenarios use, through the API itself
+    so that both clients work against any seeded database.
+    """
+    tokens = login(api, username, password)
+    ctx = {'username': username, 'password': password, 'token': tokens['access']}
+    patients = call(api, 'GET', '/api/patients/?page_size=1', token=ctx['token'])['results']
+    ctx['patient'] = patients[0]['id'] if patients else new_patient(api, ctx)['id']
+    ctx['doctor'] = call(api, 'GET', '/api/doctors/?ordering=load&page_size=1', token=ctx['token'])['results'][0]['id']
+    ctx['mapping'] = call(api, 'GET', '/api/mappings/?page_size=1', token=ctx['token'])['results'][0]['id']
+    return ctx
+
+
+# Each scenario returns (method, path, body, token) for the timed request,
+# after doing any setup it needs
+def register(api, ctx):
+    n = next(serial)
+    return 'POST', '/api/auth/register/', {
+        'username': f'bench-register-{os.getpid()}-{n}',
+        'email': f'bench-register{n}@example.com',
+        'password': BENCH_PASSWORD,
+        'password_confirm': BENCH_PASSWORD,
+        'first_name': 'Bench',
+        'last_name': 'User',
+    }, None
+
+
+def refresh(api, ctx):
+    tokens = login(api, ctx['username'], ctx['password'])
+    return 'POST', '/api/auth/refresh/', {'refresh': tokens['refresh']}, None
+
+
+def logout(api, ctx):
+    tokens = login(api, ctx['username'], ctx['password'])
+    return 'POST', '/api/auth/logout/', None, tokens['access']
+
+
+def delete_patient(api, ctx):
+    return 'DELETE', f"/api/patients/{new_patient(api, ctx)['id']}/", None, ctx['token']
+
+
+def delete_doctor(api, ctx):
+    doctor = call(api, 'POST', '/api/doctors/', new_doctor(next(serial)), ctx['token'])
+    return 'DELETE', f"/api/doctors/{doctor['id']}/", None, ctx['token']
+
+
+def create_mapping(api, ctx):
+    patient = new_patient(api, ctx)
+    return 'POST', '/api/mappings/', {'patient': patient['id'], 'doctor': ctx['doctor']}, ctx['token']
+
+
+def delete_mapping(api, ctx):
+    mapping = call(api, *create_mapping(api, ctx))
+    return 'DELETE', f"/api/mappings/{mapping['id']}/", None, ctx['token']
+
+
+def remove_mapping(api, ctx):
+    mapping = call(api, *create_mapping(api, ctx))
+    return 'DELETE', '/api/mappings/remove/', {
+        'patient_id': mapping['patient'], 'doctor_id': mapping['doctor'],
+    }, ctx['token']
+
+
+def bulk_mappings(api, ctx):
+    rows = [{'patient': new_patient(api, ctx)['id'], 'doctor': ctx['doctor']} for _ in range(20)]
+    return 'POST', '/api/mappings/bulk/', rows, ctx['token']
+
+
+def poll_changes(path):
+    """
+    Poll a change feed from a cursor that has caught up, as a syncing
+    client does between writes.
+    """
+    def build(api, ctx):
+        key = f'since:{path}'
+        if key not in ctx:
+            page = {'has_more': True}
+            while page['has_more']:
+                since = f"&since={page['since']}" if 'since' in page else ''
+                page = call(api, 'GET', f'{path}?page_size=500{since}', token=ctx['token'])
+            ctx[key] = page['since']
+        return 'GET', f'{path}?since={ctx[key]}', None, ctx['token']
+    return build
+
+
+def get(path):
+    return lambda api, ctx: ('GET', path.format(**ctx), None, ctx['token'])
+
+
+SCENARIOS = {
+    'auth.register': register,
+    'auth.login': lambda api, ctx: ('POST', '/api/auth/login/', {
+        'username': ctx['username'], 'password': ctx['password'],
+    }, None),
+    'auth.refresh': refresh,
+    'auth.logout': logout,
+
+    'patients.list': get('/api/patients/'),
+    'patients.retrieve': get('/api/patients/{patient}/'),
+    'patients.create': lambda api, ctx: ('POST', '/api/patients/', {
+        'name': f'Bench Patient {next(serial)}', 'age': 40, 'address': '2 Benchmark Street',
+    }, ctx['token']),
+    'patients.update': lambda api, ctx: ('PATCH', f"/api/patients/{ctx['patient']}/", {
+        'age': 20 + next(serial) % 60,
+    }, ctx['token']),
+    'patients.delete': delete_patient,
+    'patients.doctors': get('/api/patients/{patient}/doctors/'),
+    'patients.export': get('/api/patients/export/'),
+    'patients.changes': get('/api/patients/changes/'),
+    'patients.changes_poll': poll_changes('/api/patients/changes/'),
+
+    'doctors.list': get('/api/doctors/'),
+    'doctors.list_by_load': get('/api/doctors/?ordering=load'),
+    'doctors.retrieve': get('/api/doctors/{doctor}/'),
+    'doctors.create': lambda api, ctx: ('POST', '/api/doctors/', new_doctor(next(serial)), ctx['token']),
+    'doctors.update': lambda api, ctx: ('PATCH', f"/api/doctors/{ctx['doctor']}/", {
+        'years_of_experience': next(serial) % 40,
+    }, ctx['token']),
+    'doctors.delete': delete_doctor,
+    'doctors.patients': get('/api/doctors/{doctor}/patients/'),
+    'doctors.search': get('/api/doctors/search/?q=neuro'),
+    'doctors.bulk': lambda api, ctx: ('POST', '/api/doctors/bulk/', [
+        new_doctor(next(serial)) for _ in range(100)
+    ], ctx['token']),
+    'doctors.cache_stats': get('/api/doctors/cache-stats/'),
+    'doctors.stats': get('/api/doctors/stats/'),
+
+    'mappings.list': get('/api/mappings/'),
+    'mappings.retrieve': get('/api/mappings/{mapping}/'),
+    'mappings.create': create_mapping,
+    'mappings.delete': delete_mapping,
+    'mappings.remove': remove_mapping,
+    'mappings.by_patient': get('/api/mappings/patient/{patient}/'),
+    'mappings.bulk': bulk_mappings,
+    'mappings.export': get('/api/mappings/export/'),
+    'mappings.changes': get('/api/mappings/changes/'),
+    'mappings.changes_poll': poll_changes('/api/mappings/changes/'),
+
+    'async.patients.list': get('/api/async/patients/'),
+    'async.patients.retrieve': get('/api/async/patients/{patient}/'),
+    'async.patients.doctors': get('/api/async/patients/{patient}/doctors/'),
+    'async.doctors.list': get('/api/async/doctors/'),
+    'async.doctors.retrieve': get('/api/async/doctors/{doctor}/'),
+    'async.doctors.patients': get('/api/async/doctors/{doctor}/patients/'),
+}
+
+
+def run_scenario(api, ctx, build, requests, warmup):
+    latencies, queries, sizes, statuses = [], [], [], {}
+    for i in range(warmup + requests):
+        result = api.request(*build(api, ctx))
+        if i < warmup:
+            continue
+        latencies.append(result.ms)
+        sizes.append(len(result.body))
+        if result.queries is not None:
+            queries.append(result.queries)
+        statuses[str(result.status)] = statuses.get(str(result.status), 0) + 1
+    return {
+        'requests': requests,
+        **latency_summary(latencies),
+        'queries': max(queries) if queries else None,
+        'bytes': round(sum(sizes) / len(sizes)),
+        'statuses': statuses,
+    }
+
+
+def run_suite(api, ctx, names, requests, warmup):
+    results = {}
+    for name in names:
+        results[name] = run_scenario(api, ctx, SCENARIOS[name], requests, warmup)
+        result = results[name]
+        print(
+            f"{name:28} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+            f"p99 {result['p99_ms']:8.2f} ms  queries {result['queries'] if result['queries'] is not None else '-':>3}  "
+            f"{result['bytes']:>9} B  {result['statuses']}"
+        )
+    return results
+
+
+def print_comparison(baseline, report):
+    print(f"\nChange in p95 against {baseline.get('environment', {}).get('revision') or 'baseline'}:")
+    for name, old, new, change in compare_reports(baseline, report):
+        change = f'{change:+.1%}' if change is not None else 'n/a'
+        print(f'{name:28} {old:>10} -> {new:>10} ms  {change}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', help='Measure this running server instead of an in-process test database')
+    parser.add_argument('--username', default=BENCH_USERNAME)
+    parser.add_argument('--password', default=BENCH_PASSWORD)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--doctors', type=int, default=2000)
+    parser.add_argument('--patients', type=int, default=20000)
+    parser.add_argument('--mappings', type=int, default=100000)
+    parser.add_argument('--skew', type=float, default=1.0,
+                        help='Zipf exponent of the user and doctor popularity (0 for uniform)')
+    parser.add_argument('--requests', type=int, default=50, help='Timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per scenario')
+    parser.add_argument('--only', action='append', metavar='PREFIX', help='Run scenarios whose name starts with PREFIX')
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--compare', metavar='REPORT', help='Print the p95 change against an earlier report')
+    args = parser.parse_args()
+
+    names = [
+        name for name in SCENARIOS
+        if not args.only or any(name.startswith(prefix) for prefix in args.only)
+    ]
+    report = {
+        'environment': environment(),
+        'options': {
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'base_url': args.base_url,
+        },
+    }
+
+    if args.base_url:
+        api = HTTPClient(args.base_url)
+        ctx = discover(api, args.username, args.password)
+        report['scenarios'] = run_suite(api, ctx, names, args.requests, args.warmup)
+    else:
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            seed(args.users, args.doctors, args.patients, args.mappings, skew=args.skew)
+            print(f'Seeded {args.mappings} mappings in {time.perf_counter() - started:.1f}s')
+            report['options'].update(
+                users=args.users, doctors=args.doctors, patients=args.patients,
+                mappings=args.mappings, skew=args.skew,
+            )
+            # Every seeded row is seconds old, so the change feeds would
+            # otherwise hold all of them back
+            settings.CHANGE_FEED_SETTLE_SECONDS = 0
+            # The suite logs in far more often than any rate limit allows
+            override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}).enable()
+            api = InProcessClient()
+            ctx = discover(api, BENCH_USERNAME, BENCH_PASSWORD)
+            report['scenarios'] = run_suite(api, ctx, names, args.requests, args.warmup)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    report['environment']['database'] = connection.vendor if not args.base_url else None
+
+    if args.output:
+        write_report(args.output, report)
+        print(f'\nWrote {args.output}')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Concurrent GET load test comparing the WSGI and ASGI deployments.
+
+Start both servers against the same database, for example:
+    gunicorn healthcare.wsgi:application -w 4 -b 127.0.0.1:8000
+    gunicorn healthcare.asgi:application -w 4 -k uvicorn.workers.UvicornWorker -b 127.0.0.1:8001
+
+then run:
+    python -m benchmarks.async_load --username alice --password secret \\
+        --target wsgi=http://127.0.0.1:8000/api/doctors/ \\
+        --target asgi=http://127.0.0.1:8001/api/async/doctors/ \\
+        --concurrency 1000 --requests 20000
+
+Only the standard library is used: every request opens its own connection
+(Connection: close), as a sync gunicorn worker would require anyway.
+"""
+import argparse
+import asyncio
+import json
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from benchmarks.report import latency_summary
+
+
+def obtain_token(base_url, username, password):
+    parts = urlsplit(base_url)
+    request = urllib.request.Request(
+        f'{parts.scheme}://{parts.netloc}/api/auth/login/',
+        data=json.dumps({'username': username, 'password': password}).encode('utf-8'),
+        headers={'Content-Type': 'application/json'},
+    )
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)['access']
+
+
+async def fetch(url, token):
+    parts = urlsplit(url)
+    path = parts.path + (f'?{parts.query}' if parts.query else '')
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    writer.write((
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: {parts.netloc}\r\n'
+        f'Authorization: Bearer {token}\r\n'
+        'Accept: application/json\r\n'
+        'Connection: close\r\n\r\n'
+    ).encode('latin-1'))
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    status_line = data.split(b'\r\n', 1)[0].split()
+    return int(status_line[1]) if len(status_line) > 1 else 0
+
+
+async def run_target(url, token, concurrency, total):
+    latencies, statuses = [], {}
+    remaining = total
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                code = await fetch(url, token)
+            except OSError:
+                code = 0
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 2),
+        'rps': round(len(latencies) / elapsed, 1),
+        **latency_summary(latencies),
+        'statuses': statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', action='append', required=True, metavar='NAME=URL')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    targets = [target.split('=', 1) for target in args.target]
+    token = obtain_token(targets[0][1], args.username, args.password)
+    results = {}
+    for name, url in targets:
+        results[name] = asyncio.run(run_target(url, token, args.concurrency, args.requests))
+        print(f'{name}: {json.dumps(results[name])}')
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
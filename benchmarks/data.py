@@ -0,0 +1,117 @@
+"""
+Synthetic data for the benchmarks.
+
+Volumes are configurable and the distributions are skewed the way real
+data is: a few users own most patients and a few doctors carry most
+assignments (Zipf-like weights), so per-user and per-doctor queries see
+both small and very large result sets.
+
+Call seed() after django.setup(), against a throwaway database.
+"""
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from api.cache import invalidate_owned_patients
+from api.models import Patient, Doctor, PatientDoctorMapping, rebuild_specialty_stats
+
+SPECIALTIES = [
+    'Cardiology', 'Dermatology', 'Neurology', 'Oncology', 'Pediatrics',
+    'Psychiatry', 'Radiology', 'Orthopedics', 'Urology', 'General Practice',
+]
+BATCH_SIZE = 10000
+
+# Credentials of the first seeded user, who owns the most patients and is
+# staff so that admin-only endpoints can be measured too
+BENCH_USERNAME = 'bench0'
+BENCH_PASSWORD = 'bench-password'
+
+
+def zipf_weights(count, skew):
+    """
+    Cumulative weights for picking from count items, item i having weight
+    1 / (i + 1) ** skew. A skew of 0 gives a uniform distribution.
+    """
+    return list(itertools.accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def seed(users, doctors, patients, mappings, skew=1.0, random_seed=42):
+    """
+    Create the given number of rows and return (user_ids, doctor_ids,
+    patient_ids), each ordered from most to least popular.
+    """
+    rng = random.Random(random_seed)
+    User.objects.bulk_create(
+        [User(username=f'bench{i}', email=f'bench{i}@example.com', password='!') for i in range(users)],
+        batch_size=BATCH_SIZE,
+    )
+    User.objects.filter(username=BENCH_USERNAME).update(
+        password=make_password(BENCH_PASSWORD), is_staff=True,
+    )
+    user_ids = list(User.objects.filter(username__startswith='bench').order_by('id').values_list('id', flat=True))
+
+    Doctor.objects.bulk_create(
+        [
+            Doctor(
+                name=f'Doctor {i:07d}',
+                specialty=SPECIALTIES[i % len(SPECIALTIES)],
+                license_number=f'LIC{i:09d}',
+                phone='555-0100',
+                email=f'doctor{i}@example.com',
+                years_of_experience=i % 40,
+            )
+            for i in range(doctors)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    doctor_ids = list(Doctor.objects.order_by('id').values_list('id', flat=True))
+
+    user_weights = zipf_weights(len(user_ids), skew)
+    for start in range(0, patients, BATCH_SIZE):
+        Patient.objects.bulk_create([
+            Patient(
+                user_id=rng.choices(user_ids, cum_weights=user_weights)[0],
+                name=f'Patient {i:08d}',
+                age=rng.randint(1, 99),
+                address='1 Benchmark Street',
+                email=f'patient{i}@example.com',
+            )
+            for i in range(start, min(start + BATCH_SIZE, patients))
+        ])
+    patient_ids = list(Patient.objects.order_by('id').values_list('id', flat=True))
+    # bulk_create skips the signals that drop the owners' cached patient indexes
+    invalidate_owned_patients(*user_ids)
+
+    # Spread the assignments evenly over patients; which doctors they go
+    # to follows the skewed weights
+    doctor_weights = zipf_weights(len(doctor_ids), skew)
+    per_patient = max(1, mappings // max(1, len(patient_ids)))
+    now = timezone.now()
+    batch, created = [], 0
+    for patient_id in patient_ids:
+        chosen = set(rng.choices(doctor_ids, cum_weights=doctor_weights, k=per_patient))
+        for doctor_id in chosen:
+            batch.append(PatientDoctorMapping(
+                patient_id=patient_id,
+                doctor_id=doctor_id,
+                assigned_date=now - timedelta(seconds=rng.randint(0, 10 ** 7)),
+                is_primary=doctor_id == min(chosen),
+            ))
+        if len(batch) >= BATCH_SIZE:
+            PatientDoctorMapping.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+        if created >= mappings:
+            break
+    if batch:
+        PatientDoctorMapping.objects.bulk_create(batch)
+
+    # bulk_create skips the signals that maintain the counter columns
+    Patient.objects.recount_doctors()
+    Doctor.objects.recount_patients()
+    rebuild_specialty_stats()
+    return user_ids, doctor_ids, patient_ids
@@ -0,0 +1,104 @@
+"""
+Before/after comparison for the composite indexes added in
+api/migrations/0003_composite_indexes.py.
+
+Creates a throwaway test database on the configured backend (SQLite by
+default, Postgres when DATABASE_URL points at one), seeds it, drops the
+indexes from 0003 and prints EXPLAIN output and timings for the hot API
+queries, then recreates the indexes and repeats.
+
+Usage:
+    python -m benchmarks.index_plans --mappings 1000000
+    DATABASE_URL=postgres://... python -m benchmarks.index_plans
+"""
+import argparse
+import importlib
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
+django.setup()
+
+from django.apps import apps  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from api.models import Patient, Doctor, PatientDoctorMapping  # noqa: E402
+from benchmarks.data import seed  # noqa: E402
+
+
+def composite_indexes():
+    migration = importlib.import_module('api.migrations.0003_composite_indexes').Migration
+    return [
+        (apps.get_model('api', operation.model_name), operation.index)
+        for operation in migration.operations
+    ]
+
+
+def analyze():
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+
+
+def scenarios(user_id, doctor_id, patient_id):
+    return {
+        'patients by user, by name': lambda: Patient.objects.filter(user_id=user_id).order_by('name', 'id')[:50],
+        'mappings by doctor, newest first': lambda: PatientDoctorMapping.objects.filter(
+            doctor_id=doctor_id).order_by('-assigned_date', '-id')[:50],
+        'mappings by patient, newest first': lambda: PatientDoctorMapping.objects.filter(
+            patient_id=patient_id).order_by('-assigned_date', '-id')[:50],
+        'doctors by specialty, by name': lambda: Doctor.objects.filter(
+            specialty='Neurology').order_by('name')[:50],
+        'doctors by name': lambda: Doctor.objects.order_by('name', 'id')[:50],
+    }
+
+
+def run(label, queries, repeat):
+    print(f'\n=== {label} ({connection.vendor}) ===')
+    for name, build in queries.items():
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(build())
+            timings.append((time.perf_counter() - started) * 1000)
+        print(f'\n-- {name}: median {statistics.median(timings):.2f} ms, max {max(timings):.2f} ms')
+        print(build().explain())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--doctors', type=int, default=20000)
+    parser.add_argument('--patients', type=int, default=200000)
+    parser.add_argument('--mappings', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        started = time.perf_counter()
+        user_ids, doctor_ids, patient_ids = seed(args.users, args.doctors, args.patients, args.mappings)
+        print(f'Seeded {PatientDoctorMapping.objects.count()} mappings in {time.perf_counter() - started:.1f}s')
+
+        queries = scenarios(user_ids[0], doctor_ids[0], patient_ids[0])
+        indexes = composite_indexes()
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.remove_index(model, index)
+        analyze()
+        run('before', queries, args.repeat)
+
+        with connection.schema_editor() as editor:
+            for model, index in indexes:
+                editor.add_index(model, index)
+        analyze()
+        run('after', queries, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
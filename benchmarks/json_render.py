@@ -0,0 +1,94 @@
+"""
+Render and parse time of a large PatientDoctorMappingSerializer payload
+under DRF's stdlib JSON classes and the orjson-backed ones in
+api/renderers.py. No database is needed: rows are unsaved instances.
+
+Usage:
+    python -m benchmarks.json_render --rows 10000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import timedelta
+from io import BytesIO
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api import renderers  # noqa: E402
+from api.models import Patient, Doctor, PatientDoctorMapping  # noqa: E402
+from api.renderers import FastJSONRenderer, FastJSONParser  # noqa: E402
+from api.serializers import PatientDoctorMappingSerializer  # noqa: E402
+from benchmarks.data import SPECIALTIES  # noqa: E402
+
+
+def build_payload(rows):
+    now = timezone.now()
+    doctors = [
+        Doctor(id=i, name=f'Doctor {i:07d}', specialty=SPECIALTIES[i % len(SPECIALTIES)])
+        for i in range(1, 201)
+    ]
+    mappings = []
+    for i in range(1, rows + 1):
+        patient = Patient(id=i, name=f'Patient {i:08d}')
+        doctor = doctors[i % len(doctors)]
+        mappings.append(PatientDoctorMapping(
+            id=i, patient=patient, doctor=doctor,
+            assigned_date=now - timedelta(seconds=i), is_primary=i % 3 == 0,
+            notes='Follow-up in two weeks' if i % 2 else '',
+        ))
+    return {'next': None, 'previous': None, 'results': PatientDoctorMappingSerializer(mappings, many=True).data}
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {'median_ms': round(statistics.median(timings), 2), 'min_ms': round(min(timings), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    data = build_payload(args.rows)
+    print(f'Serialized {args.rows} mappings in {(time.perf_counter() - started) * 1000:.0f} ms')
+    body = JSONRenderer().render(data)
+    if renderers.orjson is None:
+        print('orjson is not installed: the fast classes fall back to the stdlib ones')
+    assert FastJSONRenderer().render(data) == body
+
+    results = {
+        'rows': args.rows,
+        'bytes': len(body),
+        'orjson': renderers.orjson is not None,
+        'render': {
+            'stdlib': measure(lambda: JSONRenderer().render(data), args.repeat),
+            'fast': measure(lambda: FastJSONRenderer().render(data), args.repeat),
+        },
+        'parse': {
+            'stdlib': measure(lambda: JSONParser().parse(BytesIO(body)), args.repeat),
+            'fast': measure(lambda: FastJSONParser().parse(BytesIO(body)), args.repeat),
+        },
+    }
+    for step in ('render', 'parse'):
+        stdlib, fast = results[step]['stdlib']['median_ms'], results[step]['fast']['median_ms']
+        print(f'{step:6}  stdlib {stdlib:8.2f} ms  fast {fast:8.2f} ms  {stdlib / fast:5.1f}x')
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Throughput of the list serializers against their .values() fast path
+(ValuesRepresentation in api/serializers.py), including the query.
+
+Creates a throwaway test database on the configured backend, seeds it,
+checks that both paths produce identical output and times each one over
+the same rows.
+
+Usage:
+    python -m benchmarks.list_serializers --rows 5000 --repeat 10
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'healthcare.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+from api.models import Patient, Doctor, PatientDoctorMapping  # noqa: E402
+from api.serializers import (  # noqa: E402
+    PatientListSerializer,
+    DoctorListSerializer,
+    PatientDoctorMappingSerializer,
+    values_representation
+)
+from benchmarks.data import seed  # noqa: E402
+
+
+def cases(rows):
+    return {
+        'PatientListSerializer': (PatientListSerializer, lambda: Patient.objects.all()[:rows]),
+        'DoctorListSerializer': (DoctorListSerializer, lambda: Doctor.objects.all()[:rows]),
+        'PatientDoctorMappingSerializer': (
+            PatientDoctorMappingSerializer,
+            lambda: PatientDoctorMapping.objects.with_related()[:rows],
+        ),
+    }
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000, help='Rows serialized per run')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        count = max(args.rows, 1000)
+        seed(users=10, doctors=count, patients=count, mappings=count * 2)
+        results = {}
+        for name, (serializer_class, build) in cases(args.rows).items():
+            representation = values_representation(serializer_class)
+
+            def full():
+                return serializer_class(build(), many=True).data
+
+            def fast():
+                return representation.to_representation(representation.values(build()))
+
+            assert json.dumps(full()) == json.dumps(fast()), f'{name}: fast path output differs'
+            full_ms, fast_ms = measure(full, args.repeat), measure(fast, args.repeat)
+            results[name] = {
+                'rows': args.rows,
+                'serializer_ms': round(full_ms, 2),
+                'values_ms': round(fast_ms, 2),
+                'serializer_rows_per_s': round(args.rows / full_ms * 1000),
+                'values_rows_per_s': round(args.rows / fast_ms * 1000),
+            }
+            print(f'{name:32} serializer {full_ms:8.2f} ms  values {fast_ms:8.2f} ms  {full_ms / fast_ms:5.1f}x')
+        print(json.dumps(results, indent=2))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
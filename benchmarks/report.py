@@ -0,0 +1,62 @@
+"""
+Latency summaries and JSON reports shared by the benchmark scripts.
+"""
+import json
+import platform
+import statistics
+import subprocess
+
+import django
+
+
+def latency_summary(latencies):
+    """
+    p50/p95/p99 and mean of a list of latencies in milliseconds.
+    """
+    if not latencies:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'p50_ms': round(quantiles[49], 2),
+        'p95_ms': round(quantiles[94], 2),
+        'p99_ms': round(quantiles[98], 2),
+        'mean_ms': round(statistics.fmean(latencies), 2),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+    }
+
+
+def write_report(path, report):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare_reports(baseline, current, metric='p95_ms'):
+    """
+    Yield (scenario, baseline value, current value, relative change) for
+    every scenario present in both reports.
+    """
+    before = baseline.get('scenarios', {})
+    for name, result in current.get('scenarios', {}).items():
+        if name not in before:
+            continue
+        old, new = before[name].get(metric), result.get(metric)
+        change = (new - old) / old if old and new is not None else None
+        yield name, old, new, change
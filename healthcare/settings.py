@@ -5,6 +5,7 @@ Django settings for healthcare project.
 from pathlib import Path
 import os
 from datetime import timedelta
+import django
 import dj_database_url
 from dotenv import load_dotenv
 
@@ -36,6 +37,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.ConcurrencyLimitMiddleware',
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,10 +70,40 @@ TEMPLATES = [
 WSGI_APPLICATION = 'healthcare.wsgi.application'
 
 # Database
+# Connections persist for DB_CONN_MAX_AGE seconds and are health-checked
+# before reuse. With DB_POOL_MAX_SIZE set, PostgreSQL connections come from
+# a psycopg_pool pool per worker instead (Django 5.1+ with psycopg[pool];
+# ignored on older Django versions)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True').lower() == 'true'
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '2'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '0'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+
+
+def database_config(url):
+    config = dj_database_url.parse(
+        url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=DB_CONN_HEALTH_CHECKS,
+    )
+    if (
+        DB_POOL_MAX_SIZE
+        and config['ENGINE'] == 'django.db.backends.postgresql'
+        and django.VERSION >= (5, 1)
+    ):
+        # Pooled connections go back to the pool instead of persisting
+        config['CONN_MAX_AGE'] = 0
+        config.setdefault('OPTIONS', {})['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    return config
+
+
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': database_config(DATABASE_URL)
     }
 else:
     DATABASES = {
@@ -79,6 +113,52 @@ else:
         }
     }
 
+# Read replicas (comma-separated URLs). GET requests to the patient, doctor
+# and mapping endpoints read from a random replica, except for users who
+# wrote within the last REPLICA_PIN_SECONDS, whose reads stay on the primary
+DATABASE_REPLICAS = []
+for index, url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(','))):
+    alias = f'replica{index}'
+    DATABASES[alias] = {**database_config(url.strip()), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(alias)
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['api.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+# Trigram and full-text lookups used by the doctor search on PostgreSQL
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+# Cache
+# Shared Redis cache in production, per-process memory cache otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Seconds a cached doctor list/detail response is kept
+DOCTOR_CACHE_TIMEOUT = int(os.getenv('DOCTOR_CACHE_TIMEOUT', '300'))
+
+# Per-user cached set of owned patient ids used for ownership checks, kept
+# until a patient is created, deleted or reassigned (or the timeout
+# passes); users with more patients than the max size are checked in SQL.
+# Invalidations only reach other processes through a shared cache
+# (REDIS_URL): with the per-process cache a reassigned patient can stay in
+# its old owner's index elsewhere, so reads also filter on the owner and
+# the index only turns requests away early
+OWNERSHIP_INDEX_TIMEOUT = int(os.getenv('OWNERSHIP_INDEX_TIMEOUT', '3600'))
+OWNERSHIP_INDEX_MAX_SIZE = int(os.getenv('OWNERSHIP_INDEX_MAX_SIZE', '10000'))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -107,22 +187,129 @@ STATIC_URL = 'static/'
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Authenticate API requests from the JWT claims alone instead of loading
+# the user row on every request; either way revoked tokens are tracked in
+# the cache, which must be shared (REDIS_URL) for a revocation to reach
+# every process (check warns as api.W001 when it is not).
+# A token's deny-list lookup is reused for JWT_DENYLIST_REFRESH seconds
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'True').lower() == 'true'
+JWT_USER_CACHE_SIZE = int(os.getenv('JWT_USER_CACHE_SIZE', '1024'))
+JWT_USER_CACHE_TTL = int(os.getenv('JWT_USER_CACHE_TTL', '60'))
+JWT_DENYLIST_REFRESH = int(os.getenv('JWT_DENYLIST_REFRESH', '5'))
+
+# Request instrumentation (api.middleware.PerformanceMiddleware): the share
+# of requests that get query counts, a Server-Timing header and a log line
+# on the api.performance logger, the duration above which that line is a
+# warning, and whether /metrics serves per-view histograms
+PERF_SAMPLE_RATE = float(os.getenv('PERF_SAMPLE_RATE', '1.0'))
+PERF_SLOW_REQUEST_MS = int(os.getenv('PERF_SLOW_REQUEST_MS', '1000'))
+PERF_METRICS_ENABLED = os.getenv('PERF_METRICS_ENABLED', 'False').lower() == 'true'
+
+# N+1 and slow query detection (api.query_detector), for development and
+# CI: 'warn' logs the findings on the api.queries logger, 'strict' fails
+# the request. A statement shape repeated QUERY_DETECTOR_REPEAT_THRESHOLD
+# times in one request, or a query over QUERY_DETECTOR_SLOW_MS, is reported
+QUERY_DETECTOR = os.getenv('QUERY_DETECTOR', 'off').lower()
+QUERY_DETECTOR_REPEAT_THRESHOLD = int(os.getenv('QUERY_DETECTOR_REPEAT_THRESHOLD', '10'))
+QUERY_DETECTOR_SLOW_MS = float(os.getenv('QUERY_DETECTOR_SLOW_MS', '100'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERF_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+        'api.queries': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 # Django REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.StatelessJWTAuthentication'
+        if JWT_STATELESS_AUTH else
+        'api.authentication.RevocableJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed when installed, DRF's stdlib json classes otherwise
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
-    ]
+        'api.renderers.FastJSONParser',
+    ],
+    # Token buckets (api.throttling); an empty rate disables that limit
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.UserThrottle',
+        'api.throttling.WriteThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': os.getenv('THROTTLE_USER_RATE', '1200/min') or None,
+        'anon': os.getenv('THROTTLE_ANON_RATE', '120/min') or None,
+        'write': os.getenv('THROTTLE_WRITE_RATE', '300/min') or None,
+        'auth': os.getenv('THROTTLE_AUTH_RATE', '10/min') or None,
+    },
+    # Reverse proxies in front of the app; per-IP limits trust only the
+    # X-Forwarded-For addresses they added. The default fits the usual
+    # single proxy; use 0 (the socket address) when clients connect directly
+    'NUM_PROXIES': int(os.getenv('API_NUM_PROXIES', '1')),
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetCursorPagination',
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE', '50')),
 }
 
+# Upper bound for the ?page_size= query parameter on list endpoints
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', '500'))
+
+# Maximum number of rows accepted by a single bulk request
+API_MAX_BULK_SIZE = int(os.getenv('API_MAX_BULK_SIZE', '5000'))
+
+# Serve read-only list pages from .values() rows instead of running the
+# full serializer over model instances (same JSON either way)
+API_FAST_LIST_SERIALIZERS = os.getenv('API_FAST_LIST_SERIALIZERS', 'True').lower() == 'true'
+
+# Where the throttle token buckets live: 'local' (per worker process, no
+# I/O), 'cache' (the shared cache, limits hold across workers) or the
+# dotted path of a custom store class
+THROTTLE_STORE = os.getenv('THROTTLE_STORE', 'local')
+
+# Requests one process handles at once before answering 503 with
+# Retry-After (0 disables); set it a little above the worker's thread count
+MAX_IN_FLIGHT_REQUESTS = int(os.getenv('MAX_IN_FLIGHT_REQUESTS', '0'))
+MAX_IN_FLIGHT_RETRY_AFTER = int(os.getenv('MAX_IN_FLIGHT_RETRY_AFTER', '1'))
+
+# Change feeds (/api/patients/changes/, /api/mappings/changes/): rows are
+# served once they are CHANGE_FEED_SETTLE_SECONDS old, which must exceed
+# the longest write transaction, and deletions are remembered for
+# CHANGE_FEED_RETENTION_DAYS (older cursors must sync again from scratch;
+# run prune_tombstones to drop them)
+CHANGE_FEED_SETTLE_SECONDS = int(os.getenv('CHANGE_FEED_SETTLE_SECONDS', '5'))
+CHANGE_FEED_RETENTION_DAYS = int(os.getenv('CHANGE_FEED_RETENTION_DAYS', '30'))
+
+# Background jobs (/api/jobs/, run by manage.py run_workers): uploaded
+# import files and finished exports are kept in JOB_FILES_DIR. A running
+# job whose worker has not checked in for JOB_STALE_SECONDS is requeued,
+# up to JOB_MAX_ATTEMPTS runs in all, then marked failed (imports are failed
+# at once). prune_jobs deletes jobs finished JOB_RETENTION_DAYS ago
+JOB_FILES_DIR = Path(os.getenv('JOB_FILES_DIR', BASE_DIR / 'job_files'))
+JOB_HEARTBEAT_SECONDS = int(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+JOB_STALE_SECONDS = int(os.getenv('JOB_STALE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
@@ -145,6 +332,7 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'JTI_CLAIM': 'jti',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.RevocableTokenRefreshSerializer',
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
@@ -0,0 +1,18 @@
+"""
+Django settings for running the test suite:
+
+    python manage.py test --settings=healthcare.test_settings
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASES
+
+# Tests of the replica routing get a second, separate database standing in
+# for a replica that has not caught up with the primary
+DATABASES['replica'] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'replica.sqlite3',
+}
+
+# The suite runs in one process, where the local memory cache is enough
+SILENCED_SYSTEM_CHECKS = ['api.W001']
@@ -1,22 +1,29 @@
 """
 URL configuration for healthcare project.
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from api.views import RegisterView
+from api.metrics import metrics_view
+from api.throttling import AuthThrottle
+from api.views import RegisterView, LogoutView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     
     # Authentication endpoints
     path('api/auth/register/', RegisterView.as_view(), name='auth_register'),
-    path('api/auth/login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/auth/login/', TokenObtainPairView.as_view(throttle_classes=[AuthThrottle]), name='token_obtain_pair'),
+    path('api/auth/refresh/', TokenRefreshView.as_view(throttle_classes=[AuthThrottle]), name='token_refresh'),
+    path('api/auth/logout/', LogoutView.as_view(), name='auth_logout'),
     
     # API endpoints
     path('api/', include('api.urls')),
-]
\ No newline at end of file
+]
+
+if settings.PERF_METRICS_ENABLED:
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))